@@ -20,7 +20,22 @@ class ConfigManager:
             "db_user": "admin",
             "db_password": "password",
             "db_host": "localhost",
-            "db_port": 5432
+            "db_port": 5432,
+            "prepare_statements": True,
+            "replicas": [],
+            "replica_selection": "round_robin",
+            "pool": {
+                "min_size": 1,
+                "max_size": 10,
+                "max_lifetime": 3600,
+                "max_idle": 600,
+                "wait_timeout": 30
+            },
+            "instrumentation": {
+                "enabled": True,
+                "slow_query_ms": 200,
+                "explain_slow_queries": False
+            }
         }
     }
 
@@ -1,126 +1,373 @@
-import logging
-import sqlite3
-import os
-import sys
-from network_manager import NetworkManager
-from security_manager import SecurityManager
-from encryption_manager import EncryptionManager
-from user_manager import UserManager
-
-class Core:
-    def __init__(self, host="127.0.0.1", port=8080, db_path="F:/B/backend/db/ghnet.db"):
-        """
-        Initializes the core system for the backend.
-        :param host: The host IP for the network manager.
-        :param port: The port number for the network manager.
-        :param db_path: The path to the SQLite database.
-        """
-        self.host = host
-        self.port = port
-        self.db_path = db_path
-        
-        # Initialize logging
-        self.logger = self.setup_logger()
-        
-        # Initialize the core services
-        self.db_connection = None
-        self.network_manager = None
-        self.security_manager = None
-        self.encryption_manager = None
-        self.user_manager = None
-
-    def setup_logger(self):
-        """Sets up the logging for the core system."""
-        logger = logging.getLogger("CoreLogger")
-        logger.setLevel(logging.INFO)
-        
-        # Ensure log directory exists
-        log_dir = "F:/B/logs"
-        os.makedirs(log_dir, exist_ok=True)
-        
-        log_file = os.path.join(log_dir, "core.log")
-        file_handler = logging.FileHandler(log_file)
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-        
-        return logger
-
-    def initialize_database(self):
-        """Initialize database connection."""
-        try:
-            self.db_connection = sqlite3.connect(self.db_path)
-            self.logger.info(f"Database connected at {self.db_path}")
-        except sqlite3.Error as e:
-            self.logger.error(f"Database connection error: {e}")
-            sys.exit(1)
-
-    def initialize_services(self):
-        """Initialize all required backend services."""
-        self.logger.info("Initializing backend services...")
-        
-        # Initialize network manager
-        self.network_manager = NetworkManager(self.host, self.port)
-        self.network_manager.start_server()
-        
-        # Initialize security manager
-        self.security_manager = SecurityManager(self.db_connection)
-        
-        # Initialize encryption manager
-        self.encryption_manager = EncryptionManager(self.db_connection)
-        
-        # Initialize user manager
-        self.user_manager = UserManager(self.db_connection)
-        
-        self.logger.info("All services initialized successfully.")
-
-    def start(self):
-        """Start the core system."""
-        self.logger.info("Starting Core System...")
-        
-        # Initialize database connection
-        self.initialize_database()
-
-        # Initialize services
-        self.initialize_services()
-        
-        self.logger.info("Core system started successfully.")
-
-    def stop(self):
-        """Stop the core system and close connections."""
-        self.logger.info("Stopping Core System...")
-        
-        # Stop all services
-        if self.network_manager:
-            self.network_manager.stop_server()
-        
-        # Close the database connection
-        if self.db_connection:
-            self.db_connection.close()
-        
-        self.logger.info("Core system stopped successfully.")
-    
-    def restart(self):
-        """Restart the core system."""
-        self.logger.info("Restarting Core System...")
-        self.stop()
-        self.start()
-
-    def handle_error(self, error_message):
-        """Handles errors by logging and sending appropriate responses."""
-        self.logger.error(f"Error occurred: {error_message}")
-        # You can extend this method to handle specific actions like sending alerts, etc.
-
-if __name__ == "__main__":
-    # Initialize the core system with default settings
-    core_system = Core()
-    
-    try:
-        core_system.start()
-        # The system runs indefinitely, waiting for service requests
-        while True:
-            pass
-    except KeyboardInterrupt:
-        core_system.stop()
-    except Exception as e:
-        core_system.handle_error(str(e))
+import logging
+import sqlite3
+import os
+import sys
+import signal
+import threading
+from network_manager import NetworkManager, create_listeners, close_listeners
+from security_manager import SecurityManager
+from encryption_manager import EncryptionManager
+from user_manager import UserManager
+from auth_manager import AuthManager
+from request_router import RequestRouter
+from supervisor import WorkerSupervisor
+from service_registry import ServiceRegistry
+from async_logging import setup_async_logging
+from sqlite_pool import SQLitePool
+from postgres_pool import pool_stats
+from migrations import MigrationRunner
+from query_stats import QUERY_STATS
+
+class Core:
+    def __init__(self, host="127.0.0.1", port=8080, db_path="F:/B/backend/db/ghnet.db",
+                 workers=1, network_options=None, enable_router=False, db_config=None,
+                 db_pool_size=8, db_replicas=None, db_prepare_statements=True, listen_sockets=None):
+        """
+        Initializes the core system for the backend.
+        :param host: The host IP for the network manager.
+        :param port: The port number for the network manager.
+        :param db_path: The path to the SQLite database.
+        :param workers: Number of worker processes. Above 1, start() binds the listening
+                        sockets once and pre-forks that many workers accepting on them.
+        :param network_options: Extra keyword arguments passed to NetworkManager.
+        :param enable_router: If True, the socket server speaks the framed command
+                              protocol handled by RequestRouter instead of echoing.
+                              Its handlers block on the database, so it cannot be
+                              combined with network_options mode="event_loop".
+        :param db_config: PostgreSQL settings for AuthManager/SessionManager; the AUTH,
+                          LOGOUT, VALIDATE_SESSION and GET_USER commands need it.
+        :param db_pool_size: Maximum number of pooled SQLite connections shared by the services.
+        :param db_replicas: PostgreSQL read replicas, as overrides of db_config (e.g.
+                            {"host": "replica1"}); session lookups are served by them.
+        :param db_prepare_statements: Run the session queries as server-side prepared
+                                      statements (database.prepare_statements).
+        :param listen_sockets: Listening sockets inherited from a pre-forking parent. They
+                               are served instead of binding new ones, and stop() only
+                               lets go of them, since the parent and the other workers
+                               keep accepting on them.
+        """
+        self.host = host
+        self.port = port
+        self.db_path = db_path
+        self.workers = workers
+        self.network_options = dict(network_options or {})
+        if enable_router and self.network_options.get("mode") == "event_loop":
+            # The event loop runs message handlers on its selector thread, where a
+            # blocking database call would stall every other connection
+            raise ValueError('enable_router cannot be used with mode="event_loop"; use mode="threaded"')
+        self.enable_router = enable_router
+        self.db_config = db_config
+        self.db_pool_size = db_pool_size
+        self.db_replicas = db_replicas
+        self.db_prepare_statements = db_prepare_statements
+        self.listen_sockets = listen_sockets
+        self.supervisor = None
+        self._shutdown_event = threading.Event()
+        self._restart_requested = False
+        self._ready = threading.Event()
+        self._handoff_source = None
+        self.service_registry = None
+        
+        # Initialize logging
+        self.logger = self.setup_logger()
+        QUERY_STATS.setup_logger()
+        
+        # Initialize the core services
+        self.db_pool = None
+        self.network_manager = None
+        self.security_manager = None
+        self.encryption_manager = None
+        self.user_manager = None
+        self.auth_manager = None
+        self.session_manager = None
+        self.request_router = None
+
+    def setup_logger(self):
+        """Sets up the logging for the core system; file writes happen on a background thread."""
+        logger = logging.getLogger("CoreLogger")
+        logger.setLevel(logging.INFO)
+        
+        # Ensure log directory exists
+        log_dir = "F:/B/logs"
+        os.makedirs(log_dir, exist_ok=True)
+        
+        log_file = os.path.join(log_dir, "core.log")
+        file_handler = logging.FileHandler(log_file)
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        file_handler.setFormatter(formatter)
+        setup_async_logging(logger, [file_handler])
+        
+        return logger
+
+    def initialize_database(self):
+        """Initialize the SQLite connection pool shared by the services."""
+        try:
+            # Services use the pool from the registry's worker threads and every client
+            # thread; each checkout gets a WAL-mode connection no other thread is using
+            self.db_pool = SQLitePool(self.db_path, max_connections=self.db_pool_size)
+            with self.db_pool.connection():
+                pass
+            self.logger.info(f"Database connected at {self.db_path}")
+        except sqlite3.Error as e:
+            self.logger.error(f"Database connection error: {e}")
+            sys.exit(1)
+
+    def register_services(self, registry):
+        """
+        Declares the backend services and the services each one depends on.
+        :param registry: The ServiceRegistry to populate.
+        """
+        registry.register("security_manager", lambda deps: SecurityManager(self.db_pool))
+        registry.register("encryption_manager", lambda deps: EncryptionManager(self.db_pool))
+        registry.register("user_manager", lambda deps: UserManager(self.db_path, pool=self.db_pool))
+
+        if self.enable_router:
+            router_dependencies = ["user_manager"]
+            if self.db_config:
+                registry.register("database_schema", lambda deps: MigrationRunner(self.db_config).run())
+                registry.register("auth_manager",
+                                  lambda deps: AuthManager(self.db_config, prepare_statements=self.db_prepare_statements,
+                                                           replicas=self.db_replicas),
+                                  depends_on=["database_schema"])
+                router_dependencies.append("auth_manager")
+            registry.register("request_router", self._create_request_router, depends_on=router_dependencies)
+
+        # The network manager depends on everything so requests never reach missing services
+        registry.register("network_manager", self._create_network_manager, depends_on=list(registry.factories))
+
+    def _create_request_router(self, deps):
+        """Builds the command router over the long-lived manager instances."""
+        auth_manager = deps.get("auth_manager")
+        return RequestRouter.for_managers(
+            auth_manager=auth_manager,
+            session_manager=auth_manager.session_manager if auth_manager else None,
+            user_manager=deps["user_manager"],
+            logger=self.logger
+        )
+
+    def _create_network_manager(self, deps):
+        """Builds the network manager; it starts listening only once every service is ready."""
+        network_options = dict(self.network_options)
+        request_router = deps.get("request_router")
+        if request_router:
+            network_options.update(framed=True, message_handler=request_router.dispatch)
+        network_manager = NetworkManager(self.host, self.port, **network_options)
+        if request_router:
+            request_router.register("METRICS", lambda args: network_manager.get_metrics())
+            if self.db_config:
+                request_router.register("DB_POOL_STATS", lambda args: pool_stats())
+                request_router.register("QUERY_STATS", lambda args: QUERY_STATS.snapshot(args.get("limit")))
+        return network_manager
+
+    def initialize_services(self):
+        """Initialize all required backend services, independent ones concurrently."""
+        self.logger.info("Initializing backend services...")
+
+        self.service_registry = ServiceRegistry(logger=self.logger)
+        self.register_services(self.service_registry)
+        services = self.service_registry.start_all()
+
+        self.security_manager = services["security_manager"]
+        self.encryption_manager = services["encryption_manager"]
+        self.user_manager = services["user_manager"]
+        self.auth_manager = services.get("auth_manager")
+        self.session_manager = self.auth_manager.session_manager if self.auth_manager else None
+        self.request_router = services.get("request_router")
+        self.network_manager = services["network_manager"]
+
+        # Readiness gate: accept connections only after every service is up. During a
+        # restart, take over the previous server's listening sockets instead of rebinding
+        listen_sockets = self._handoff_source.detach_listeners() if self._handoff_source else self.listen_sockets
+        self.network_manager.start_server(listen_sockets=listen_sockets)
+        self._ready.set()
+        
+        self.logger.info("All services initialized successfully.")
+
+    def wait_until_ready(self, timeout=None):
+        """
+        Block until the services are initialized and the server is accepting connections.
+        :param timeout: Maximum time to wait, in seconds.
+        :return: True if the core system is ready.
+        """
+        return self._ready.wait(timeout)
+
+    def start(self):
+        """Start the core system."""
+        self.logger.info("Starting Core System...")
+
+        if self.workers > 1:
+            self.start_workers()
+            return
+        
+        # Initialize database connection
+        self.initialize_database()
+
+        # Initialize services
+        self.initialize_services()
+        
+        self.logger.info("Core system started successfully.")
+
+    def start_workers(self):
+        """
+        Pre-fork worker processes that each run a full Core on listening sockets bound
+        here. Connections queued on them are never lost when a single worker exits.
+        """
+        self.listen_sockets = create_listeners(
+            self.host, self.port,
+            unix_socket_path=self.network_options.get("unix_socket_path"),
+            backlog=self.network_options.get("backlog", 128)
+        )
+        worker_options = {
+            "db_path": self.db_path,
+            "network_options": self.network_options,
+            "enable_router": self.enable_router,
+            "db_config": self.db_config,
+            "db_pool_size": self.db_pool_size,
+            "db_replicas": self.db_replicas,
+            "db_prepare_statements": self.db_prepare_statements,
+            "listen_sockets": self.listen_sockets,
+        }
+        self.supervisor = WorkerSupervisor(
+            target=run_worker,
+            args=(self.host, self.port, worker_options),
+            workers=self.workers,
+            logger=self.logger
+        )
+        self.supervisor.start()
+        self.logger.info(f"Core system started with {self.workers} worker processes.")
+
+    def stop(self):
+        """Stop the core system and close connections."""
+        self.logger.info("Stopping Core System...")
+        self._ready.clear()
+
+        # Stop worker processes in pre-fork mode
+        if self.supervisor:
+            self.supervisor.stop()
+            self.supervisor = None
+            close_listeners(self.listen_sockets, self.network_options.get("unix_socket_path"))
+            self.listen_sockets = None
+        
+        # Stop all services
+        if self.network_manager:
+            if self.listen_sockets:
+                # Inherited from the parent: stop accepting and let go of them, leaving
+                # queued connections to the other workers
+                for listen_socket in self.network_manager.detach_listeners():
+                    listen_socket.close()
+            self.network_manager.stop_server()
+        
+        # Close the database connections
+        if self.db_pool:
+            self.db_pool.close()
+        
+        self.logger.info("Core system stopped successfully.")
+    
+    def restart(self):
+        """
+        Restart the core system without refusing connections.
+
+        New services are built while the old ones keep serving. The bound listening
+        sockets are then handed to the new network manager, and the old one drains
+        its connections in the background. In pre-fork mode the workers are replaced
+        one at a time instead.
+        """
+        self.logger.info("Restarting Core System...")
+        if self.supervisor:
+            if self.supervisor.rolling_restart():
+                self.logger.info("Core system restarted.")
+            else:
+                self.logger.error("Core system restart aborted; remaining workers were kept.")
+            return
+
+        previous_network, previous_db = self.network_manager, self.db_pool
+        if previous_network is None or not previous_network.listen_sockets:
+            self.stop()
+            self.start()
+            return
+
+        self._handoff_source = previous_network
+        try:
+            self.initialize_database()
+            self.initialize_services()
+        finally:
+            self._handoff_source = None
+
+        threading.Thread(target=self._retire, args=(previous_network, previous_db), daemon=True).start()
+        self.logger.info("Core system restarted.")
+
+    def _retire(self, network_manager, db_pool):
+        """Drains a replaced network manager and closes its database connections."""
+        network_manager.stop_server()
+        if db_pool:
+            db_pool.close()
+
+    def request_shutdown(self):
+        """Ask run_forever() to stop the core system. Safe to call from any thread or signal handler."""
+        self._shutdown_event.set()
+
+    def request_restart(self):
+        """Ask run_forever() to restart the core system, e.g. to pick up new configuration."""
+        self._restart_requested = True
+        self._shutdown_event.set()
+
+    def install_signal_handlers(self):
+        """Map SIGTERM/SIGINT to a graceful shutdown and SIGHUP (where available) to a restart."""
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.request_shutdown())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.request_shutdown())
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.request_restart())
+
+    def run_forever(self, install_signals=True):
+        """
+        Start the core system and block, idle, until a shutdown is requested.
+        :param install_signals: Install the SIGTERM/SIGINT/SIGHUP handlers. Only possible
+                                from the main thread.
+        """
+        if install_signals:
+            self.install_signal_handlers()
+        self._shutdown_event.clear()
+        self.start()
+        try:
+            while True:
+                # A timed wait keeps Ctrl+C responsive on Windows while costing no CPU
+                while not self._shutdown_event.wait(1.0):
+                    pass
+                if not self._restart_requested:
+                    break
+                self._restart_requested = False
+                self._shutdown_event.clear()
+                self.restart()
+        finally:
+            self.stop()
+
+    def handle_error(self, error_message):
+        """Handles errors by logging and sending appropriate responses."""
+        self.logger.error(f"Error occurred: {error_message}")
+        # You can extend this method to handle specific actions like sending alerts, etc.
+
+def run_worker(host, port, options, ready=None):
+    """
+    Entry point of a pre-forked worker process: runs a single-process Core until SIGTERM.
+    :param host: The host IP for the network manager.
+    :param port: The port number for the network manager.
+    :param options: Remaining Core keyword arguments for the worker.
+    :param ready: Optional multiprocessing.Event, set once the worker accepts connections.
+    """
+    core = Core(host, port, **options)
+    if ready is not None:
+        def notify_ready():
+            if core.wait_until_ready():
+                ready.set()
+        threading.Thread(target=notify_ready, name="WorkerReady", daemon=True).start()
+    core.run_forever()
+
+if __name__ == "__main__":
+    # Initialize the core system with default settings
+    core_system = Core()
+    
+    try:
+        # Blocks, idle, until SIGTERM/SIGINT; SIGHUP restarts the services
+        core_system.run_forever()
+    except Exception as e:
+        core_system.handle_error(str(e))
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class ServiceRegistry:
+    def __init__(self, logger=None, max_workers=None):
+        """
+        Holds the backend services, their factories and the dependencies between them.
+        :param logger: Logger used for the startup report.
+        :param max_workers: Maximum number of services initialized concurrently.
+        """
+        self.logger = logger or logging.getLogger("CoreLogger")
+        self.max_workers = max_workers
+        self.factories = {}
+        self.dependencies = {}
+        self.services = {}
+        self.timings = {}
+        self.ready = threading.Event()
+
+    def register(self, name, factory, depends_on=()):
+        """
+        Registers a service.
+        :param name: Unique service name.
+        :param factory: Callable taking a dict of the already initialized dependencies
+                        (name -> instance) and returning the service instance.
+        :param depends_on: Names of the services that must be initialized first.
+        """
+        self.factories[name] = factory
+        self.dependencies[name] = tuple(depends_on)
+
+    def get(self, name):
+        """Returns an initialized service, or None if it does not exist."""
+        return self.services.get(name)
+
+    def _check_dependencies(self):
+        """Rejects unknown dependencies and dependency cycles before anything starts."""
+        for name, depends_on in self.dependencies.items():
+            for dependency in depends_on:
+                if dependency not in self.factories:
+                    raise ValueError(f"Service '{name}' depends on unknown service '{dependency}'")
+
+        visiting, visited = set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle involving service '{name}'")
+            visiting.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.factories:
+            visit(name)
+
+    def _initialize(self, name):
+        """Runs one factory and records how long it took."""
+        started = time.perf_counter()
+        dependencies = {dependency: self.services[dependency] for dependency in self.dependencies[name]}
+        service = self.factories[name](dependencies)
+        self.timings[name] = time.perf_counter() - started
+        return service
+
+    def start_all(self):
+        """
+        Initializes every registered service, running independent ones concurrently.
+        Sets the ready event once all of them are up.
+        :return: A dict of service name to instance.
+        :raises Exception: The first factory error; services still pending are not started.
+        """
+        self._check_dependencies()
+        self.ready.clear()
+        started = time.perf_counter()
+        pending = set(self.factories)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ServiceInit") as executor:
+            while pending or running:
+                # Launch every service whose dependencies are all initialized
+                for name in [n for n in pending if all(d in self.services for d in self.dependencies[n])]:
+                    pending.discard(name)
+                    running[executor.submit(self._initialize, name)] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.services[name] = future.result()
+                    except Exception as e:
+                        self.logger.error(f"Service '{name}' failed to initialize: {e}")
+                        for other in running:
+                            other.cancel()
+                        raise
+
+        self.timings["total"] = time.perf_counter() - started
+        self.ready.set()
+        self.logger.info(self.timing_report())
+        return dict(self.services)
+
+    def timing_report(self):
+        """Formats the per-service initialization times, slowest first."""
+        lines = ["Service startup timings:"]
+        for name, seconds in sorted(self.timings.items(), key=lambda item: -item[1]):
+            if name != "total":
+                lines.append(f"  {name}: {seconds * 1000:.1f} ms")
+        if "total" in self.timings:
+            lines.append(f"  total (wall clock): {self.timings['total'] * 1000:.1f} ms")
+        return "\n".join(lines)
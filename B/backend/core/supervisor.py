@@ -0,0 +1,145 @@
+import logging
+import multiprocessing
+import multiprocessing.connection
+import threading
+import time
+
+
+class WorkerSupervisor:
+    def __init__(self, target, args=(), workers=2, logger=None, restart_delay=1.0, max_restart_delay=30.0):
+        """
+        Launches and supervises a fixed number of worker processes.
+        :param target: Top-level function each worker process runs. It is called with a
+                       ready keyword argument, a multiprocessing.Event to set once the
+                       worker is accepting connections.
+        :param args: Positional arguments passed to the target.
+        :param workers: Number of worker processes to keep alive.
+        :param logger: Logger used for lifecycle messages.
+        :param restart_delay: Initial delay before restarting a crashed worker, in seconds.
+        :param max_restart_delay: Upper bound for the restart back-off, in seconds.
+        """
+        self.target = target
+        self.args = args
+        self.workers = workers
+        self.logger = logger or logging.getLogger("CoreLogger")
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+
+        self.processes = {}
+        self._ready = {}
+        self._started_at = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._monitor_thread = None
+
+    def start(self):
+        """Spawns every worker and starts the monitor thread that restarts crashed ones."""
+        self._stopping.clear()
+        for slot in range(self.workers):
+            self._spawn(slot)
+        self._monitor_thread = threading.Thread(target=self._monitor, name="WorkerSupervisor", daemon=True)
+        self._monitor_thread.start()
+
+    def _spawn(self, slot):
+        """Starts the worker process for the given slot."""
+        ready = multiprocessing.Event()
+        process = multiprocessing.Process(target=self.target, args=self.args, kwargs={"ready": ready},
+                                          name=f"CoreWorker-{slot}", daemon=True)
+        process.start()
+        self.processes[slot] = process
+        self._ready[slot] = ready
+        self._started_at[slot] = time.monotonic()
+        self.logger.info(f"Worker {slot} started with pid {process.pid}")
+
+    def _monitor(self):
+        """Waits for worker exits and restarts them with exponential back-off."""
+        delays = {slot: self.restart_delay for slot in self.processes}
+        while not self._stopping.is_set():
+            with self._lock:
+                sentinels = {process.sentinel: (slot, process) for slot, process in self.processes.items()}
+            ready = multiprocessing.connection.wait(list(sentinels), timeout=1.0)
+            for sentinel in ready:
+                if self._stopping.is_set():
+                    return
+                slot, process = sentinels[sentinel]
+                if self.processes.get(slot) is not process:
+                    continue  # Retired by rolling_restart; its replacement is already running
+                process.join()
+                self.logger.error(f"Worker {slot} (pid {process.pid}) exited with code {process.exitcode}")
+
+                # Reset the back-off once a worker has stayed up for a while
+                if time.monotonic() - self._started_at[slot] > self.max_restart_delay:
+                    delays[slot] = self.restart_delay
+                if self._stopping.wait(delays[slot]):
+                    return
+                delays[slot] = min(delays[slot] * 2, self.max_restart_delay)
+                with self._lock:
+                    if self.processes.get(slot) is process:
+                        self._spawn(slot)
+
+    def _wait_ready(self, slot, process, timeout):
+        """
+        Waits until the worker in the given slot reports that it is accepting connections.
+        :return: False if it exited or did not become ready within timeout seconds.
+        """
+        ready = self._ready[slot]
+        deadline = time.monotonic() + timeout
+        while not ready.wait(0.1):
+            if not process.is_alive() or time.monotonic() >= deadline:
+                return False
+        return True
+
+    def rolling_restart(self, ready_timeout=30.0, timeout=10.0):
+        """
+        Replaces the workers one at a time. Each replacement must be accepting
+        connections on the shared listening sockets before its predecessor is
+        terminated, so the port is never left unserved. A replacement that fails to become ready is
+        discarded, its predecessor is kept, and the restart stops there.
+        :param ready_timeout: Time given to a replacement to start serving, in seconds.
+        :param timeout: Time to wait for a retired worker to exit before killing it, in seconds.
+        :return: True if every worker was replaced.
+        """
+        for slot in list(self.processes):
+            with self._lock:
+                previous, previous_ready = self.processes[slot], self._ready[slot]
+                self._spawn(slot)
+                replacement = self.processes[slot]
+            if not self._wait_ready(slot, replacement, ready_timeout):
+                self.logger.error(f"Worker {slot} replacement (pid {replacement.pid}) did not become ready; "
+                                  f"keeping pid {previous.pid}")
+                with self._lock:
+                    self.processes[slot], self._ready[slot] = previous, previous_ready
+                replacement.kill()
+                replacement.join()
+                return False
+            previous.terminate()
+            previous.join(timeout)
+            if previous.is_alive():
+                previous.kill()
+                previous.join()
+            self.logger.info(f"Worker {slot} replaced (old pid {previous.pid})")
+        return True
+
+    def stop(self, timeout=10.0):
+        """
+        Terminates every worker and waits for them to exit.
+        :param timeout: Total time to wait for workers before killing them, in seconds.
+        """
+        self._stopping.set()
+        if self._monitor_thread:
+            self._monitor_thread.join(timeout=2)
+            self._monitor_thread = None
+
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + timeout
+        for slot, process in self.processes.items():
+            process.join(timeout=max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                self.logger.warning(f"Worker {slot} did not exit in time; killing it")
+                process.kill()
+                process.join()
+        self.processes = {}
+        self._ready = {}
@@ -0,0 +1,145 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# What happens when the log queue is full:
+#   "drop"   - discard the record and count it (never blocks the caller)
+#   "block"  - wait for room in the queue (never loses a record)
+#   "sample" - keep one in every sample_rate overflowing records, drop the rest
+# Under "drop" and "sample", WARNING and above (and sampled records) wait up to
+# priority_timeout seconds for room before being dropped, so the caller's wait is bounded.
+OVERFLOW_POLICIES = ("drop", "block", "sample")
+
+# Logger name -> (listener, queue handler, pid of the process that started the listener)
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    A QueueHandler over a bounded queue with a configurable overflow policy.
+    """
+
+    def __init__(self, log_queue, overflow="drop", sample_rate=100, priority_timeout=0.05):
+        """
+        Initialize the handler.
+
+        Args:
+            log_queue (queue.Queue): Bounded queue shared with the QueueListener.
+            overflow (str): Overflow policy, one of OVERFLOW_POLICIES.
+            sample_rate (int): With the "sample" policy, keep one in this many overflowing records.
+            priority_timeout (float): Longest wait for room, in seconds, for WARNING and above
+                                      and sampled records under "drop" and "sample".
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.sample_rate = sample_rate
+        self.priority_timeout = priority_timeout
+        self.dropped = 0
+        self._overflowed = 0
+
+    def enqueue(self, record):
+        """
+        Put a record on the queue, applying the overflow policy when it is full.
+
+        Args:
+            record (logging.LogRecord): The prepared record.
+        """
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            self._overflowed += 1
+        if record.levelno >= logging.WARNING or (
+                self.overflow == "sample" and self._overflowed % self.sample_rate == 0):
+            try:
+                self.queue.put(record, timeout=self.priority_timeout)
+                return
+            except queue.Full:
+                pass
+        self.dropped += 1
+
+
+class DrainingQueueListener(QueueListener):
+    """
+    A QueueListener whose stop() waits for room for its sentinel instead of failing
+    when the queue is full.
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def setup_async_logging(logger, handlers, capacity=10000, overflow="drop"):
+    """
+    Route a logger's output through a background writer thread.
+
+    The logger only gets a BoundedQueueHandler, so callers never wait on file or
+    console I/O; a QueueListener thread feeds the records to the real handlers.
+    Calling this again for the same logger closes the given handlers and returns
+    the existing listener instead of attaching duplicates. In a forked child, whose
+    copy of the listener has no writer thread, the queue and listener are rebuilt.
+
+    Args:
+        logger (logging.Logger): The logger to configure.
+        handlers (list): The handlers that perform the actual I/O.
+        capacity (int): Maximum number of records buffered in memory.
+        overflow (str): Overflow policy, one of OVERFLOW_POLICIES.
+
+    Returns:
+        QueueListener: The started listener.
+    """
+    with _listeners_lock:
+        if logger.name in _listeners:
+            listener, queue_handler, pid = _listeners.pop(logger.name)
+            if pid == os.getpid():
+                # Already configured; the new handlers are not needed
+                _listeners[logger.name] = (listener, queue_handler, pid)
+                for handler in handlers:
+                    handler.close()
+                return listener
+            # Inherited across fork(): nothing drains this queue in this process
+            logger.removeHandler(queue_handler)
+
+        log_queue = queue.Queue(maxsize=capacity)
+        queue_handler = BoundedQueueHandler(log_queue, overflow=overflow)
+        logger.addHandler(queue_handler)
+        listener = DrainingQueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners[logger.name] = (listener, queue_handler, os.getpid())
+        return listener
+
+
+def dropped_records(logger):
+    """
+    Count the records a logger has dropped because its queue was full.
+
+    Args:
+        logger (logging.Logger): A logger configured with setup_async_logging.
+
+    Returns:
+        int: The number of dropped records.
+    """
+    return sum(handler.dropped for handler in logger.handlers if isinstance(handler, BoundedQueueHandler))
+
+
+@atexit.register
+def stop_async_logging():
+    """
+    Flush and stop every background writer and detach the queue handlers.
+    Registered to run at interpreter exit.
+    """
+    with _listeners_lock:
+        for name, (listener, queue_handler, pid) in _listeners.items():
+            logging.getLogger(name).removeHandler(queue_handler)
+            if pid == os.getpid():
+                listener.stop()
+        _listeners.clear()
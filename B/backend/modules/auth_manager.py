@@ -1,18 +1,22 @@
 from session_manager import SessionManager
 from password_manager import PasswordManager
-import psycopg2
+from postgres_pool import get_pool
 from psycopg2 import sql
 from datetime import datetime
 
 class AuthManager:
-    def __init__(self, db_config):
+    def __init__(self, db_config, pool=None, prepare_statements=True, replicas=None, replica_selection="round_robin"):
         self.db_config = db_config
-        self.session_manager = SessionManager(db_config)  # Initialize SessionManager
+        self.pool = pool or get_pool(db_config)
+        # Initialize SessionManager; its session lookups may be served by read replicas
+        self.session_manager = SessionManager(
+            db_config, pool=self.pool, prepare_statements=prepare_statements,
+            replicas=replicas, replica_selection=replica_selection
+        )
 
     def _get_connection(self):
-        """Establish a connection to the database."""
-        connection = psycopg2.connect(**self.db_config)
-        return connection
+        """Check out a connection from the shared pool; it is returned when the with-block exits."""
+        return self.pool.connection()
 
     def register_user(self, username, email, password):
         """Register a new user."""
@@ -36,24 +40,25 @@ class AuthManager:
             query = sql.SQL("""
                 SELECT password FROM users WHERE username = %s
             """)
+            # Release the connection before creating the session, which checks out its own
             with self._get_connection() as conn:
                 with conn.cursor() as cursor:
                     cursor.execute(query, (username,))
                     result = cursor.fetchone()
 
-                    if result:
-                        stored_password = result[0]
-                        if PasswordManager.verify_password(password, stored_password):
-                            # Create a session after successful login
-                            session_token = self.session_manager.create_session(username)
-                            print("User logged in successfully.")
-                            return session_token
-                        else:
-                            print("Invalid password.")
-                            return None
-                    else:
-                        print("User not found.")
-                        return None
+            if result:
+                stored_password = result[0]
+                if PasswordManager.verify_password(password, stored_password):
+                    # Create a session after successful login
+                    session_token = self.session_manager.create_session(username)
+                    print("User logged in successfully.")
+                    return session_token
+                else:
+                    print("Invalid password.")
+                    return None
+            else:
+                print("User not found.")
+                return None
         except Exception as e:
             print(f"An error occurred while logging in: {e}")
             return None
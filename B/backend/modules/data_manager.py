@@ -1,15 +1,196 @@
-import psycopg2
+import json
+import threading
+from collections import OrderedDict
+from itertools import chain, islice
 from psycopg2 import sql
-from datetime import datetime
+from psycopg2.extras import execute_values
+from datetime import date, datetime
+from postgres_pool import get_pool
+from replicas import ReplicaSet
+
+# Characters that must be escaped in COPY's text format
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _text_value(value):
+    """Render a non-NULL value as Postgres input text, before any COPY escaping."""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\x" + bytes(value).hex()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, list):
+        return _array_literal(value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return str(value)
+
+
+def _array_literal(values):
+    """Render a list, possibly nested, as a Postgres array literal such as {"a",NULL}."""
+    elements = []
+    for value in values:
+        if value is None:
+            elements.append("NULL")
+        elif isinstance(value, list):
+            elements.append(_array_literal(value))
+        else:
+            elements.append('"' + _text_value(value).replace("\\", "\\\\").replace('"', '\\"') + '"')
+    return "{" + ",".join(elements) + "}"
+
+
+def _copy_value(value):
+    """Render one value in COPY's text format, lists as arrays and dicts as JSON."""
+    if value is None:
+        return "\\N"
+    return _text_value(value).translate(COPY_ESCAPES)
+
+
+class PartialBatchError(Exception):
+    """
+    Raised by update_many and delete_many when a batch fails after earlier batches
+    were committed. The original error is chained as __cause__.
+    """
+
+    def __init__(self, message, completed):
+        super().__init__(message)
+        # Rows affected by the batches committed before the failure
+        self.completed = completed
+
+
+class _CopyRowStream:
+    """A file-like reader that renders rows in COPY's text format as they are read."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ""
+        # psycopg2 reports a failing read() as QueryCanceled; keep the original error
+        self.error = None
+
+    def read(self, size=-1):
+        """Return up to size characters of COPY data, rendering only as many rows as needed."""
+        parts = [self.buffer]
+        length = len(self.buffer)
+        try:
+            for row in self.rows:
+                line = "\t".join(map(_copy_value, row)) + "\n"
+                parts.append(line)
+                length += len(line)
+                if 0 <= size <= length:
+                    break
+        except Exception as e:
+            self.error = e
+            raise
+        data = "".join(parts)
+        if size < 0:
+            size = length
+        self.buffer = data[size:]
+        return data[:size]
+
+
+def _join_identifiers(columns):
+    """Render column names as a comma-separated list of quoted identifiers."""
+    return sql.SQL(', ').join(map(sql.Identifier, columns))
+
+
+def _column_types(conn, table, columns):
+    """Look up the SQL type of each column, without length modifiers, for casting VALUES."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT attname, format_type(atttypid, NULL) FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attname = ANY(%s) AND attnum > 0 AND NOT attisdropped
+        """, (sql.Identifier(table).as_string(conn), list(columns)))
+        types = dict(cursor.fetchall())
+    missing = [column for column in columns if column not in types]
+    if missing:
+        raise ValueError(f"Unknown columns in {table}: {', '.join(missing)}")
+    return types
+
+
+def _build_update_many(conn, table, columns):
+    """
+    Build UPDATE ... FROM (VALUES %s) for update_many. Literals in a VALUES list are
+    typed on their own, so each batch column is cast to the type of its table column.
+    """
+    key_columns, set_columns = columns
+    types = _column_types(conn, table, key_columns + set_columns)
+
+    def batch_column(col):
+        return sql.Identifier("batch", col) + sql.SQL("::" + types[col])
+
+    return sql.SQL("UPDATE {} AS target SET {} FROM (VALUES %s) AS batch ({}) WHERE {}").format(
+        sql.Identifier(table),
+        sql.SQL(', ').join([sql.Identifier(col) + sql.SQL(" = ") + batch_column(col) for col in set_columns]),
+        _join_identifiers(key_columns + set_columns),
+        sql.SQL(' AND ').join([sql.Identifier("target", col) + sql.SQL(" = ") + batch_column(col)
+                               for col in key_columns])
+    )
+
+
+# Builders for the dynamic statements, called as builder(conn, table, columns). For
+# "update", columns holds the SET columns followed by the condition column; for
+# "update_many", it is a (key columns, SET columns) pair.
+STATEMENT_BUILDERS = {
+    "insert": lambda conn, table, columns: sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
+        sql.Identifier(table), _join_identifiers(columns), sql.SQL(', ').join(map(sql.Placeholder, columns))
+    ),
+    "update": lambda conn, table, columns: sql.SQL("UPDATE {} SET {} WHERE {} = %s").format(
+        sql.Identifier(table),
+        sql.SQL(', ').join([sql.Identifier(col) + sql.SQL(" = %s") for col in columns[:-1]]),
+        sql.Identifier(columns[-1])
+    ),
+    "delete": lambda conn, table, columns: sql.SQL("DELETE FROM {} WHERE {} = %s").format(
+        sql.Identifier(table), sql.Identifier(columns[0])
+    ),
+    "copy": lambda conn, table, columns: sql.SQL("COPY {} ({}) FROM STDIN").format(
+        sql.Identifier(table), _join_identifiers(columns)
+    ),
+    "update_many": _build_update_many,
+    "delete_many": lambda conn, table, columns: sql.SQL("DELETE FROM {} WHERE {} = ANY(%s)").format(
+        sql.Identifier(table), sql.Identifier(columns[0])
+    ),
+}
+
 
 class DataManager:
-    def __init__(self, db_config):
+    def __init__(self, db_config, pool=None, replicas=None, replica_selection="round_robin",
+                 statement_cache_size=256, batch_size=1000):
         self.db_config = db_config
+        # Rows per statement in update_many/delete_many
+        self.batch_size = batch_size
+        self.pool = pool or get_pool(db_config)
+        # Reads go to the read replicas, if any are configured
+        self.replicas = ReplicaSet.from_config(db_config, replicas, replica_selection, pool=self.pool)
+        # Rendered SQL of the dynamic statements, least recently used first
+        self.statement_cache_size = statement_cache_size
+        self._statement_cache = OrderedDict()
+        self._statement_cache_lock = threading.Lock()
 
     def _get_connection(self):
-        """Establish a connection to the database."""
-        connection = psycopg2.connect(**self.db_config)
-        return connection
+        """Check out a connection from the shared pool; it is returned when the with-block exits."""
+        return self.pool.connection()
+
+    def _compile(self, conn, operation, table, columns):
+        """
+        Return the SQL text of a dynamic statement, rendering it only once per shape.
+
+        Statements are cached by (operation, table, columns) in an LRU of
+        statement_cache_size entries; conn is only used to render a missing one.
+        """
+        key = (operation, table, tuple(columns))
+        with self._statement_cache_lock:
+            statement = self._statement_cache.get(key)
+            if statement is not None:
+                self._statement_cache.move_to_end(key)
+                return statement
+
+        statement = STATEMENT_BUILDERS[operation](conn, table, key[2]).as_string(conn)
+        with self._statement_cache_lock:
+            self._statement_cache[key] = statement
+            if len(self._statement_cache) > self.statement_cache_size:
+                self._statement_cache.popitem(last=False)
+        return statement
 
     def insert_data(self, table, data):
         """Insert data into the specified table."""
@@ -21,17 +202,12 @@ class DataManager:
             if not isinstance(data, dict):
                 raise ValueError("Data must be a dictionary of column-value pairs")
 
-            columns = data.keys()
-            query = sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
-                sql.Identifier(table),
-                sql.SQL(', ').join(map(sql.Identifier, columns)),
-                sql.SQL(', ').join(map(sql.Placeholder, columns))
-            )
-
-            # Debugging: Print the final SQL query
-            print("SQL Query:", query.as_string(self._get_connection()))
-            
             with self._get_connection() as conn:
+                query = self._compile(conn, "insert", table, data.keys())
+
+                # Debugging: Print the final SQL query
+                print("SQL Query:", query)
+
                 with conn.cursor() as cursor:
                     # Pass the data dictionary directly, not as a list
                     cursor.execute(query, data)
@@ -40,35 +216,134 @@ class DataManager:
         except Exception as e:
             print(f"An error occurred while inserting data: {e}")
 
+    def copy_from(self, table, source, columns, chunk_size=65536):
+        """
+        Bulk-load rows with COPY FROM STDIN and return the number of rows loaded.
+
+        The source is streamed in chunk_size pieces, so memory use does not depend on
+        how many rows are loaded. Everything is loaded in one transaction.
+
+        source is either an iterable of row sequences ordered like columns, or a file
+        object with COPY text-format data (tab-separated, \\N for NULL).
+
+        Errors propagate and leave nothing loaded, so a failed load cannot be mistaken
+        for an empty one.
+        """
+        if not hasattr(source, "read"):
+            source = _CopyRowStream(source)
+
+        with self._get_connection() as conn:
+            query = self._compile(conn, "copy", table, columns)
+            with conn.cursor() as cursor:
+                try:
+                    cursor.copy_expert(query, source, size=chunk_size)
+                except Exception:
+                    if getattr(source, "error", None) is not None:
+                        raise source.error from None
+                    raise
+                conn.commit()
+                return cursor.rowcount
+
+    def insert_many(self, table, rows, chunk_size=65536):
+        """
+        Insert many rows, given as dictionaries with the same keys, and return how many were inserted.
+
+        Rows are streamed through COPY (see copy_from) instead of one INSERT per row.
+        A row missing one of the first row's keys raises KeyError and nothing is inserted.
+        """
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return 0
+        columns = list(first.keys())
+
+        def values():
+            yield [first[column] for column in columns]
+            for row in rows:
+                yield [row[column] for column in columns]
+
+        return self.copy_from(table, values(), columns, chunk_size=chunk_size)
+
+    def select(self, table, columns=None, where=None, order_by=None, limit=None, itersize=2000):
+        """
+        Lazily iterate over the matching rows of a table.
+
+        Rows come from a server-side cursor in batches of itersize, so memory use does
+        not grow with the table. The pooled connection (a read replica, if configured)
+        is held until the iterator is exhausted or closed.
+
+        columns: column names to return; all columns if omitted.
+        where: {column: value} conditions, combined with AND. None matches NULL and a
+               list or tuple matches any of its values.
+        order_by: a column name, or a list of column names and (column, "ASC"/"DESC") pairs.
+        """
+        projection = sql.SQL(', ').join(map(sql.Identifier, columns)) if columns else sql.SQL("*")
+        query = sql.SQL("SELECT {} FROM {}").format(projection, sql.Identifier(table))
+        params = []
+
+        if where:
+            conditions = []
+            for column, value in where.items():
+                if value is None:
+                    conditions.append(sql.SQL("{} IS NULL").format(sql.Identifier(column)))
+                    continue
+                if isinstance(value, (list, tuple)):
+                    conditions.append(sql.SQL("{} = ANY(%s)").format(sql.Identifier(column)))
+                    value = list(value)
+                else:
+                    conditions.append(sql.SQL("{} = %s").format(sql.Identifier(column)))
+                params.append(value)
+            query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+
+        if order_by:
+            if isinstance(order_by, (str, tuple)):
+                order_by = [order_by]
+            ordering = []
+            for item in order_by:
+                column, direction = (item, "ASC") if isinstance(item, str) else item
+                direction = direction.upper()
+                if direction not in ("ASC", "DESC"):
+                    raise ValueError(f"Invalid sort direction: {direction}")
+                ordering.append(sql.Identifier(column) + sql.SQL(" " + direction))
+            query += sql.SQL(" ORDER BY ") + sql.SQL(", ").join(ordering)
+
+        if limit is not None:
+            query += sql.SQL(" LIMIT %s")
+            params.append(limit)
+
+        with self.replicas.read_connection() as conn:
+            with conn.cursor(name="data_manager_select") as cursor:
+                cursor.itersize = itersize
+                cursor.execute(query, params)
+                for row in cursor:
+                    yield row
+
     def select_data(self, table):
-        """Select all data from the specified table."""
+        """Select all data from the specified table and return the rows."""
         try:
             query = sql.SQL("SELECT * FROM {}").format(sql.Identifier(table))
-            with self._get_connection() as conn:
+
+            def select(conn):
                 with conn.cursor() as cursor:
                     cursor.execute(query)
-                    data = cursor.fetchall()
-                    print(data)
+                    return cursor.fetchall()
+
+            data = self.replicas.run_read(select)
+            print(data)
+            return data
         except Exception as e:
             print(f"An error occurred while selecting data: {e}")
 
     def update_data(self, table, data, condition):
         """Update data in the specified table based on a condition."""
         try:
-            set_columns = data.keys()
+            set_columns = list(data.keys())
             set_values = [data[column] for column in set_columns]
             condition_column = list(condition.keys())[0]
             condition_value = list(condition.values())[0]
-            
-            query = sql.SQL("UPDATE {} SET {} WHERE {} = %s").format(
-                sql.Identifier(table),
-                sql.SQL(', ').join(
-                    [sql.Identifier(col) + sql.SQL(" = %s") for col in set_columns]
-                ),
-                sql.Identifier(condition_column)
-            )
 
             with self._get_connection() as conn:
+                query = self._compile(conn, "update", table, set_columns + [condition_column])
                 with conn.cursor() as cursor:
                     cursor.execute(query, set_values + [condition_value])
                     conn.commit()
@@ -81,12 +356,9 @@ class DataManager:
         try:
             condition_column = list(condition.keys())[0]
             condition_value = list(condition.values())[0]
-            query = sql.SQL("DELETE FROM {} WHERE {} = %s").format(
-                sql.Identifier(table),
-                sql.Identifier(condition_column)
-            )
 
             with self._get_connection() as conn:
+                query = self._compile(conn, "delete", table, [condition_column])
                 with conn.cursor() as cursor:
                     cursor.execute(query, [condition_value])
                     conn.commit()
@@ -94,6 +366,69 @@ class DataManager:
         except Exception as e:
             print(f"An error occurred while deleting data: {e}")
 
+    def update_many(self, table, rows, key_columns, batch_size=None):
+        """
+        Update many rows, given as dictionaries with the same keys, and return how many were updated.
+
+        Each batch is a single UPDATE ... FROM (VALUES ...) that matches rows on
+        key_columns and sets every other key, and is committed on its own. Keys must
+        be unique within a batch. If a batch fails, PartialBatchError reports how many
+        rows the committed batches updated.
+        """
+        batch_size = batch_size or self.batch_size
+        key_columns = tuple(key_columns)
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return 0
+        set_columns = tuple(column for column in first if column not in key_columns)
+        if not set_columns:
+            raise ValueError("Rows must have at least one column besides the key columns")
+        columns = key_columns + set_columns
+        rows = chain([first], rows)
+
+        updated = 0
+        try:
+            with self._get_connection() as conn:
+                query = self._compile(conn, "update_many", table, (key_columns, set_columns))
+                with conn.cursor() as cursor:
+                    while True:
+                        batch = [[row[column] for column in columns] for row in islice(rows, batch_size)]
+                        if not batch:
+                            break
+                        execute_values(cursor, query, batch, page_size=len(batch))
+                        conn.commit()
+                        updated += cursor.rowcount
+            return updated
+        except Exception as e:
+            raise PartialBatchError(f"update_many failed after updating {updated} rows: {e}", updated) from e
+
+    def delete_many(self, table, column, values, batch_size=None):
+        """
+        Delete the rows whose column matches any of values and return how many were deleted.
+
+        Each batch of values is one DELETE ... WHERE column = ANY(%s), committed on its own.
+        If a batch fails, PartialBatchError reports how many rows the committed batches
+        deleted.
+        """
+        batch_size = batch_size or self.batch_size
+        deleted = 0
+        try:
+            values = iter(values)
+            with self._get_connection() as conn:
+                query = self._compile(conn, "delete_many", table, [column])
+                with conn.cursor() as cursor:
+                    while True:
+                        batch = list(islice(values, batch_size))
+                        if not batch:
+                            break
+                        cursor.execute(query, (batch,))
+                        conn.commit()
+                        deleted += cursor.rowcount
+            return deleted
+        except Exception as e:
+            raise PartialBatchError(f"delete_many failed after deleting {deleted} rows: {e}", deleted) from e
+
 # Example usage
 if __name__ == "__main__":
     db_config = {
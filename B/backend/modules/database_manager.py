@@ -1,11 +1,16 @@
 import os
 import sys
-import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
+from itertools import islice
 from contextlib import contextmanager
 from dotenv import load_dotenv
 from config_manager import ConfigManager
 from logger import Logger
+from postgres_pool import get_pool, execute_prepared
+from migrations import MigrationRunner
+from query_stats import QUERY_STATS
+from replicas import ReplicaSet
 
 # Add the modules directory to the Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), "modules"))
@@ -65,9 +70,24 @@ class DatabaseManager:
     A class to manage database interactions.
     """
 
-    def __init__(self):
+    # Replica entries in the config use the same keys as the primary's settings
+    REPLICA_KEYS = {
+        "db_name": "dbname",
+        "db_user": "user",
+        "db_password": "password",
+        "db_host": "host",
+        "db_port": "port"
+    }
+
+    def __init__(self, pool=None, prepare_statements=None):
         """
         Initialize the DatabaseManager instance.
+
+        Args:
+            pool (PostgresPool): Connection pool to use; defaults to the process-wide
+                                 pool for the configured database.
+            prepare_statements (bool): Run the fixed queries as prepared statements;
+                                       defaults to database.prepare_statements in the config.
         """
         self.config_manager = ConfigManager()
         self.db_config = {
@@ -77,88 +97,197 @@ class DatabaseManager:
             "host": self.config_manager.get("database.db_host"),
             "port": self.config_manager.get("database.db_port")
         }
+        self.pool = pool or get_pool(self.db_config, **self.config_manager.get("database.pool", {}))
+        QUERY_STATS.configure(**self.config_manager.get("database.instrumentation", {}))
+        QUERY_STATS.setup_logger()
+        if prepare_statements is None:
+            prepare_statements = self.config_manager.get("database.prepare_statements", True)
+        self.prepare_statements = prepare_statements
+        replicas = [
+            {self.REPLICA_KEYS[key]: value for key, value in replica.items() if key in self.REPLICA_KEYS}
+            for replica in self.config_manager.get("database.replicas", [])
+        ]
+        self.replicas = ReplicaSet.from_config(
+            self.db_config, replicas, self.config_manager.get("database.replica_selection", "round_robin"),
+            pool=self.pool, **self.config_manager.get("database.pool", {})
+        )
 
     @contextmanager
     def _get_connection(self):
         """
-        Context manager for obtaining a database connection.
+        Context manager for obtaining a pooled database connection.
 
         Yields:
             psycopg2 connection: A connection object for the database.
         """
-        connection = psycopg2.connect(**self.db_config)
-        try:
+        with self.pool.connection() as connection:
             yield connection
-        finally:
-            connection.close()
 
     @contextmanager
-    def _get_cursor(self, connection):
+    def _get_cursor(self, connection, name=None):
         """
         Context manager for obtaining a database cursor.
 
         Args:
             connection (psycopg2 connection): The active database connection.
+            name (str): Name for a server-side cursor, which fetches rows in batches
+                        instead of transferring the whole result at once.
 
         Yields:
             psycopg2 cursor: A cursor object for executing queries.
         """
-        cursor = connection.cursor()
+        cursor = connection.cursor(name=name)
         try:
             yield cursor
         finally:
             cursor.close()
 
+    def _execute(self, cursor, query, params=()):
+        """
+        Execute one of the fixed queries, prepared once per connection when enabled.
+
+        Args:
+            cursor (psycopg2 cursor): The cursor to execute on.
+            query (str): The statement, using %s placeholders.
+            params (sequence): Positional parameters for the placeholders.
+        """
+        if self.prepare_statements:
+            execute_prepared(cursor, query, params)
+        else:
+            cursor.execute(query, params)
+
     def initialize_database(self):
         """
-        Initialize the database with required tables.
+        Bring the database schema up to date by applying pending migrations.
+
+        Returns:
+            list: The migration versions applied by this call.
         """
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username VARCHAR(50) NOT NULL UNIQUE,
-            email VARCHAR(100) NOT NULL UNIQUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
+        return MigrationRunner(pool=self.pool).run()
+
+    def insert_user(self, username, email):
+        """
+        Insert a new user, or update the email of the existing user with that username.
+
+        Args:
+            username (str): The username of the user.
+            email (str): The email of the user.
+
+        Returns:
+            int: The ID of the inserted or updated user.
+        """
+        upsert_query = """
+        INSERT INTO users (username, email) VALUES (%s, %s)
+        ON CONFLICT (username) DO UPDATE SET email = EXCLUDED.email
+        RETURNING id;
         """
         with self._get_connection() as conn:
             with self._get_cursor(conn) as cur:
-                cur.execute(create_table_query)
+                self._execute(cur, upsert_query, (username, email))
+                user_id = cur.fetchone()[0]
                 conn.commit()
+                return user_id
 
-    def insert_user(self, username, email):
+    def insert_users(self, users, batch_size=1000):
         """
-        Insert a new user into the database.
+        Insert or update many users in a single transaction.
+
+        Each batch is sent as one multi-row INSERT, so loading a large user list costs
+        one round trip per batch instead of one per user. Usernames must be unique
+        within the iterable.
 
         Args:
-            username (str): The username of the user.
-            email (str): The email of the user.
+            users (iterable): (username, email) pairs.
+            batch_size (int): Number of users sent per statement.
 
         Returns:
-            int: The ID of the newly inserted user.
+            list: The IDs of the inserted or updated users, in input order.
         """
-        insert_query = """
-        INSERT INTO users (username, email) VALUES (%s, %s) RETURNING id;
+        upsert_query = """
+        INSERT INTO users (username, email) VALUES %s
+        ON CONFLICT (username) DO UPDATE SET email = EXCLUDED.email
+        RETURNING id;
         """
+        user_ids = []
+        users = iter(users)
         with self._get_connection() as conn:
             with self._get_cursor(conn) as cur:
-                cur.execute(insert_query, (username, email))
+                while True:
+                    batch = list(islice(users, batch_size))
+                    if not batch:
+                        break
+                    rows = execute_values(cur, upsert_query, batch, page_size=len(batch), fetch=True)
+                    user_ids.extend(row[0] for row in rows)
                 conn.commit()
-                return cur.fetchone()[0]
+        return user_ids
 
     def fetch_users(self):
         """
         Fetch all users from the database.
 
+        Loads the whole table into memory; use iter_users or fetch_users_page for
+        large tables. Like the other reads, it is served by a read replica when
+        database.replicas is configured.
+
         Returns:
             list: A list of user records.
         """
         select_query = "SELECT id, username, email, created_at FROM users;"
-        with self._get_connection() as conn:
+
+        def fetch(conn):
             with self._get_cursor(conn) as cur:
                 cur.execute(select_query)
                 return cur.fetchall()
 
+        return self.replicas.run_read(fetch)
+
+    def iter_users(self, batch_size=1000):
+        """
+        Stream all users, ordered by ID, holding at most one batch in memory.
+
+        Rows come from a server-side cursor, which keeps a pooled connection checked
+        out until the generator is exhausted or closed.
+
+        Args:
+            batch_size (int): Number of rows fetched per round trip.
+
+        Yields:
+            tuple: A user record.
+        """
+        select_query = "SELECT id, username, email, created_at FROM users ORDER BY id;"
+        with self.replicas.read_connection() as conn:
+            with self._get_cursor(conn, name="iter_users") as cur:
+                cur.itersize = batch_size
+                cur.execute(select_query)
+                for row in cur:
+                    yield row
+
+    def fetch_users_page(self, after_id=0, limit=100):
+        """
+        Fetch one page of users using keyset pagination.
+
+        The page starts right after after_id, so every page is an index range scan no
+        matter how deep into the table it is.
+
+        Args:
+            after_id (int): ID of the last user on the previous page; 0 for the first page.
+            limit (int): Maximum number of users on the page.
+
+        Returns:
+            list: User records ordered by ID; pass the last ID as after_id for the next page.
+        """
+        select_query = """
+        SELECT id, username, email, created_at FROM users
+        WHERE id > %s ORDER BY id LIMIT %s;
+        """
+
+        def fetch(conn):
+            with self._get_cursor(conn) as cur:
+                self._execute(cur, select_query, (after_id, limit))
+                return cur.fetchall()
+
+        return self.replicas.run_read(fetch)
+
 def main():
     # Initialize Logger
     logger = Logger("application.log")
@@ -1,6 +1,7 @@
 import os
 import logging
 from logging.handlers import RotatingFileHandler
+from async_logging import setup_async_logging
 
 
 class Logger:
@@ -8,7 +9,8 @@ class Logger:
     A class to manage logging for the application.
     """
 
-    def __init__(self, log_file_path="F:\\B\\backend\\logs\\app.log", max_log_size=5 * 1024 * 1024, backup_count=3):
+    def __init__(self, log_file_path="F:\\B\\backend\\logs\\app.log", max_log_size=5 * 1024 * 1024, backup_count=3,
+                 queue_size=10000, overflow="drop"):
         """
         Initialize the Logger instance.
 
@@ -16,10 +18,15 @@ class Logger:
             log_file_path (str): Path to the log file.
             max_log_size (int): Maximum size of a single log file in bytes.
             backup_count (int): Number of backup files to keep.
+            queue_size (int): Log records buffered for the background writer thread.
+            overflow (str): Policy when that buffer is full: "drop", "block" or "sample"
+                (see async_logging.py).
         """
         self.log_file_path = os.path.abspath(log_file_path)
         self.max_log_size = max_log_size
         self.backup_count = backup_count
+        self.queue_size = queue_size
+        self.overflow = overflow
         self.logger = logging.getLogger("ProjectBLogger")
         self.logger.setLevel(logging.DEBUG)
         self._setup_handlers()
@@ -27,6 +34,9 @@ class Logger:
     def _setup_handlers(self):
         """
         Set up file and console handlers for the logger.
+
+        The handlers are driven by a background listener thread, so logging calls
+        only enqueue a record and never block on file or console I/O.
         """
         # Ensure the directory for the log file exists
         log_dir = os.path.dirname(self.log_file_path)
@@ -49,9 +59,9 @@ class Logger:
         console_handler.setFormatter(console_formatter)
         console_handler.setLevel(logging.INFO)
 
-        # Adding handlers to the logger
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        # Adding handlers to the logger through the background writer
+        setup_async_logging(self.logger, [file_handler, console_handler],
+                            capacity=self.queue_size, overflow=self.overflow)
 
     def log(self, level, message):
         """
@@ -0,0 +1,118 @@
+from postgres_pool import get_pool
+
+# Lock key that serializes concurrent runners, e.g. pre-forked workers starting together
+MIGRATION_LOCK_ID = 727001
+
+# Ordered schema migrations: (version, description, statements). Never edit a released
+# migration; append a new one instead.
+MIGRATIONS = [
+    (1, "Create users table", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(50) NOT NULL UNIQUE,
+            email VARCHAR(100) NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (2, "Add users.password for AuthManager", [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS password VARCHAR(255)",
+    ]),
+    (3, "Create sessions table keyed by token", [
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_token TEXT PRIMARY KEY,
+            username VARCHAR(50) NOT NULL,
+            expiration_time BIGINT NOT NULL
+        )
+        """,
+        # A sessions table that predates this migration may lack a token index
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1
+                FROM pg_index i
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                WHERE i.indrelid = 'sessions'::regclass
+                  AND i.indisunique
+                  AND i.indnatts = 1
+                  AND a.attname = 'session_token'
+            ) THEN
+                CREATE UNIQUE INDEX sessions_session_token_idx ON sessions (session_token);
+            END IF;
+        END
+        $$
+        """,
+        "CREATE INDEX IF NOT EXISTS sessions_expiration_time_idx ON sessions (expiration_time)",
+    ]),
+]
+
+
+class MigrationRunner:
+    """
+    Applies pending schema migrations and records them in the schema_version table.
+    """
+
+    def __init__(self, db_config=None, pool=None, migrations=None):
+        """
+        Initialize the MigrationRunner.
+
+        Args:
+            db_config (dict): Database settings; used to find the shared pool if none is given.
+            pool (PostgresPool): Connection pool to run the migrations on.
+            migrations (list): (version, description, statements) tuples; defaults to MIGRATIONS.
+        """
+        self.pool = pool or get_pool(db_config)
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda migration: migration[0])
+
+    def current_version(self):
+        """
+        Get the schema version of the database.
+
+        Returns:
+            int: The highest applied migration version, or 0 for a new database.
+        """
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT to_regclass('schema_version')")
+                if cursor.fetchone()[0] is None:
+                    return 0
+                cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                return cursor.fetchone()[0]
+
+    def run(self):
+        """
+        Apply every pending migration in one transaction.
+
+        Concurrent runners wait on an advisory lock, so each migration is applied once.
+
+        Returns:
+            list: The versions applied by this call.
+        """
+        applied = []
+        with self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                current = cursor.fetchone()[0]
+
+                for version, description, statements in self.migrations:
+                    if version <= current:
+                        continue
+                    for statement in statements:
+                        cursor.execute(statement)
+                    cursor.execute(
+                        "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                        (version, description)
+                    )
+                    applied.append(version)
+        return applied
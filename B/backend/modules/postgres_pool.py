@@ -0,0 +1,379 @@
+import collections
+import itertools
+import os
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+from query_stats import QUERY_STATS, InstrumentedCursor, register_prepared_statement
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Names of the statements prepared on each connection, keyed by statement text
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+_statement_ids = itertools.count(1)
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection becomes available within the pool's wait timeout."""
+
+
+class PostgresPool:
+    """
+    A thread-safe pool of PostgreSQL connections.
+
+    Unlike psycopg2.pool.ThreadedConnectionPool, callers wait for a free connection
+    instead of failing at once, connections are health-checked on checkout, and
+    every connection is replaced once it reaches max_lifetime. Statements run on
+    pooled connections are recorded in QUERY_STATS.
+    """
+
+    def __init__(self, db_config, min_size=1, max_size=10, max_lifetime=3600.0, max_idle=600.0,
+                 wait_timeout=30.0, health_check_after=5.0):
+        """
+        Initialize the pool. Connections are opened on demand, up to max_size.
+
+        Args:
+            db_config (dict): Keyword arguments for psycopg2.connect.
+            min_size (int): Idle connections kept open regardless of max_idle.
+            max_size (int): Maximum number of open connections.
+            max_lifetime (float): Seconds after which a connection is closed and replaced.
+            max_idle (float): Seconds after which idle connections beyond min_size are closed.
+            wait_timeout (float): Seconds to wait for a free connection before raising PoolTimeout.
+            health_check_after (float): Connections idle for longer than this many seconds
+                                        are pinged with SELECT 1 before being handed out.
+        """
+        self.db_config = dict(db_config)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.wait_timeout = wait_timeout
+        self.health_check_after = health_check_after
+        self.pid = os.getpid()
+        self.closed = False
+
+        self._idle = collections.deque()
+        self._opened_at = {}
+        self._released_at = {}
+        self._size = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "health_check_failures": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    def _connect(self):
+        """
+        Open a new connection.
+
+        Returns:
+            psycopg2 connection: The new connection.
+        """
+        conn = psycopg2.connect(cursor_factory=InstrumentedCursor, **self.db_config)
+        now = time.monotonic()
+        with self._condition:
+            self._opened_at[conn] = now
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _close(self, conn):
+        """Close a connection and give its slot back. Must be called with the condition held."""
+        self._opened_at.pop(conn, None)
+        self._released_at.pop(conn, None)
+        self._size -= 1
+        self._stats["connections_closed"] += 1
+        self._condition.notify()
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _expired(self, conn, now):
+        """Whether a connection has outlived max_lifetime."""
+        return now - self._opened_at.get(conn, now) >= self.max_lifetime
+
+    def _healthy(self, conn, now):
+        """
+        Check an idle connection before handing it out.
+
+        Args:
+            conn (psycopg2 connection): The connection to check.
+            now (float): Current time.monotonic() value.
+
+        Returns:
+            bool: False if the connection is closed, expired or does not answer a ping.
+        """
+        if conn.closed or self._expired(conn, now):
+            return False
+        if now - self._released_at.get(conn, now) < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._condition:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    def _trim_idle(self, now):
+        """Close idle connections beyond min_size that have been unused for max_idle seconds."""
+        while len(self._idle) > self.min_size and now - self._released_at.get(self._idle[0], now) >= self.max_idle:
+            self._close(self._idle.popleft())
+
+    def getconn(self):
+        """
+        Check out a connection, waiting up to wait_timeout for one to become free.
+
+        Returns:
+            psycopg2 connection: A connection owned by the caller until putconn().
+
+        Raises:
+            PoolError: If the pool is closed.
+            PoolTimeout: If no connection became available in time.
+        """
+        started = time.monotonic()
+        deadline = started + self.wait_timeout
+        while True:
+            conn = None
+            with self._condition:
+                while True:
+                    if self.closed:
+                        raise PoolError("connection pool is closed")
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"no connection available within {self.wait_timeout} seconds")
+                    self._waiting += 1
+                    try:
+                        self._condition.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+            elif not self._healthy(conn, time.monotonic()):
+                with self._condition:
+                    self._close(conn)
+                continue
+
+            waited = time.monotonic() - started
+            with self._condition:
+                self._stats["checkouts"] += 1
+                self._stats["wait_time_total"] += waited
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+            QUERY_STATS.record_wait(waited)
+            return conn
+
+    def putconn(self, conn, discard=False):
+        """
+        Return a connection to the pool.
+
+        Args:
+            conn (psycopg2 connection): A connection obtained from getconn().
+            discard (bool): Close the connection instead of reusing it.
+        """
+        if os.getpid() != self.pid:
+            # Inherited across fork(); closing it here would end the parent's session
+            return
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        now = time.monotonic()
+        with self._condition:
+            if discard or conn.closed or self.closed or self._expired(conn, now):
+                self._close(conn)
+                return
+            self._released_at[conn] = now
+            self._idle.append(conn)
+            self._trim_idle(now)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for the duration of a with-block.
+
+        The transaction is committed when the block succeeds and rolled back when it
+        raises; a connection that broke during the block is discarded.
+
+        Yields:
+            psycopg2 connection: The checked-out connection.
+        """
+        conn = self.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            raise
+        finally:
+            self.putconn(conn)
+
+    def load(self):
+        """
+        Estimate how busy the pool is, without locking.
+
+        Returns:
+            int: Connections checked out plus callers waiting for one.
+        """
+        return self._size - len(self._idle) + self._waiting
+
+    def stats(self):
+        """
+        Report the pool's current size and cumulative counters.
+
+        Returns:
+            dict: Pool statistics, suitable for a monitoring endpoint.
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update(
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._size - len(self._idle),
+                waiting=self._waiting,
+                max_size=self.max_size,
+            )
+        return stats
+
+    def close(self):
+        """Close idle connections now; checked-out connections close when returned."""
+        with self._condition:
+            self.closed = True
+            while self._idle:
+                self._close(self._idle.pop())
+            self._condition.notify_all()
+
+
+def _pool_key(db_config):
+    """Identify a database by its connection settings."""
+    return tuple(sorted((key, str(value)) for key, value in db_config.items()))
+
+
+def get_pool(db_config, **options):
+    """
+    Return the process-wide pool for a database, creating it on first use.
+
+    Managers configured with the same settings share one pool. A process forked
+    from the one that created a pool gets a fresh pool of its own.
+
+    Args:
+        db_config (dict): Keyword arguments for psycopg2.connect.
+        **options: PostgresPool settings, applied only when the pool is created.
+
+    Returns:
+        PostgresPool: The shared pool.
+    """
+    key = _pool_key(db_config)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed or pool.pid != os.getpid():
+            pool = PostgresPool(db_config, **options)
+            _pools[key] = pool
+        return pool
+
+
+def pool_stats():
+    """
+    Report statistics for every pool created in this process.
+
+    Returns:
+        dict: Pool statistics keyed by "user@host:port/dbname".
+    """
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == os.getpid()]
+    return {
+        "{user}@{host}:{port}/{dbname}".format(
+            user=pool.db_config.get("user", ""),
+            host=pool.db_config.get("host", ""),
+            port=pool.db_config.get("port", ""),
+            dbname=pool.db_config.get("dbname", ""),
+        ): pool.stats()
+        for pool in pools
+    }
+
+
+def _positional(query):
+    """Rewrite psycopg2 %s placeholders as the $1, $2, ... parameters PREPARE expects."""
+    numbers = itertools.count(1)
+    return _PLACEHOLDER.sub(lambda match: "%" if match.group() == "%%" else f"${next(numbers)}", query)
+
+
+def execute_prepared(cursor, query, params=()):
+    """
+    Execute a fixed statement through a server-side prepared statement.
+
+    The first call on a connection PREPAREs the statement, so Postgres parses and
+    plans it once per connection; later calls only EXECUTE it by name. Prepared
+    statements outlive transactions and are dropped with their connection.
+
+    Args:
+        cursor (psycopg2 cursor): A cursor on the connection to run the statement on.
+        query (str or sql.Composable): The statement, using %s placeholders.
+        params (sequence): Positional parameters for the placeholders.
+    """
+    connection = cursor.connection
+    if not isinstance(query, str):
+        query = query.as_string(connection)
+    query = query.strip().rstrip(";")
+
+    with _prepared_lock:
+        statements = _prepared.setdefault(connection, {})
+        name = statements.get(query)
+    if name is None:
+        name = f"stmt_{next(_statement_ids)}"
+        cursor.execute(f"PREPARE {name} AS {_positional(query)}")
+        statements[query] = name
+        register_prepared_statement(connection, name, query)
+
+    if params:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
+
+
+def close_pools():
+    """Close every pool created in this process."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        if pool.pid == os.getpid():
+            pool.close()
@@ -0,0 +1,342 @@
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import psycopg2
+import psycopg2.extensions
+from async_logging import setup_async_logging
+
+_FINGERPRINT_RULES = [
+    (re.compile(r"^PREPARE \w+ AS\b"), "PREPARE ? AS"),
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s|%\(\w+\)s|\$\d+"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*"), "(...)"),
+    (re.compile(r"\s+"), " "),
+]
+_EXECUTE = re.compile(r"EXECUTE (\w+)")
+_FINGERPRINT_CACHE_SIZE = 1024
+# Longer statements are usually literal-inlined bulk batches (execute_values) that
+# never repeat, so caching them would only evict the hot queries
+_MAX_CACHED_STATEMENT = 4096
+
+# Statement text of each prepared statement, by connection and name, so EXECUTE calls
+# are reported under the query they run. Entries go away with their connection.
+_prepared_text = weakref.WeakKeyDictionary()
+_prepared_text_lock = threading.Lock()
+
+
+def register_prepared_statement(connection, name, query):
+    """
+    Remember the text behind a prepared statement name.
+
+    Args:
+        connection (psycopg2 connection): The connection the statement was prepared on.
+        name (str): The prepared statement name.
+        query (str): The statement it was prepared from.
+    """
+    with _prepared_text_lock:
+        _prepared_text.setdefault(connection, {})[name] = query
+
+
+def param_shape(params):
+    """
+    Describe query parameters by type and size without revealing their values.
+
+    Args:
+        params: The parameters passed to execute().
+
+    Returns:
+        str: A description such as "(str[64], int)".
+    """
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {param_shape(value)}" for key, value in params.items()) + "}"
+    if isinstance(params, (list, tuple)):
+        return "(" + ", ".join(_value_shape(value) for value in params) + ")"
+    return _value_shape(params)
+
+
+def _value_shape(value):
+    """Describe one parameter value."""
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+class QueryStats:
+    """
+    Aggregates per-statement latency and row counts, keyed by query fingerprint, and
+    logs statements slower than a threshold.
+    """
+
+    def __init__(self, enabled=True, slow_query_ms=200, explain_slow_queries=False, logger=None):
+        """
+        Initialize the collector.
+
+        Args:
+            enabled (bool): Record statements at all.
+            slow_query_ms (float): Statements taking at least this long are logged.
+            explain_slow_queries (bool): Log the EXPLAIN (ANALYZE) plan of slow SELECTs.
+                                         This runs the query a second time.
+            logger (logging.Logger): Logger for the slow-query log.
+        """
+        self.logger = logger or logging.getLogger("QueryLogger")
+        self._lock = threading.Lock()
+        self._fingerprints = OrderedDict()
+        self._fingerprints_lock = threading.Lock()
+        self.configure(enabled, slow_query_ms, explain_slow_queries)
+        self.reset()
+
+    def setup_logger(self, log_file="F:/B/logs/query_stats.log"):
+        """
+        Write the slow-query log and dump() output to a file on a background thread.
+
+        Args:
+            log_file (str): Path of the log file.
+        """
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        file_handler = logging.FileHandler(log_file)
+        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        self.logger.setLevel(logging.INFO)
+        setup_async_logging(self.logger, [file_handler])
+
+    def configure(self, enabled=True, slow_query_ms=200, explain_slow_queries=False):
+        """
+        Change the collector's settings, e.g. from the database.instrumentation config.
+
+        Args:
+            enabled (bool): Record statements at all.
+            slow_query_ms (float): Statements taking at least this long are logged.
+            explain_slow_queries (bool): Log the EXPLAIN (ANALYZE) plan of slow SELECTs.
+        """
+        self.enabled = enabled
+        self.slow_query_threshold = slow_query_ms / 1000.0
+        self.explain_slow_queries = explain_slow_queries
+
+    def reset(self):
+        """Discard everything recorded so far."""
+        with self._lock:
+            self._queries = {}
+            self._waits = {"count": 0, "total": 0.0, "max": 0.0}
+
+    def fingerprint(self, query, cache=True):
+        """
+        Normalize a statement so that calls differing only in literals share one entry.
+
+        Fingerprints of short statements are kept in an LRU of _FINGERPRINT_CACHE_SIZE
+        entries.
+
+        Args:
+            query (str): The statement text.
+            cache (bool): Whether the statement may be cached; pass False for statements
+                          with inlined literals.
+
+        Returns:
+            str: The fingerprint.
+        """
+        cache = cache and len(query) <= _MAX_CACHED_STATEMENT
+        if cache:
+            with self._fingerprints_lock:
+                fingerprint = self._fingerprints.get(query)
+                if fingerprint is not None:
+                    self._fingerprints.move_to_end(query)
+                    return fingerprint
+
+        fingerprint = query.strip().rstrip(";")
+        for pattern, replacement in _FINGERPRINT_RULES:
+            fingerprint = pattern.sub(replacement, fingerprint)
+
+        if cache:
+            with self._fingerprints_lock:
+                self._fingerprints[query] = fingerprint
+                if len(self._fingerprints) > _FINGERPRINT_CACHE_SIZE:
+                    self._fingerprints.popitem(last=False)
+        return fingerprint
+
+    def observe(self, cursor, query, params, duration, failed=False):
+        """
+        Record one executed statement; called by InstrumentedCursor.
+
+        Args:
+            cursor (psycopg2 cursor): The cursor that ran the statement.
+            query (str, bytes or sql.Composable): The statement.
+            params: The statement parameters.
+            duration (float): Execution time in seconds.
+            failed (bool): Whether the statement raised.
+        """
+        # Bytes statements come from execute_values and similar helpers that inline
+        # their literals, so they are not worth caching
+        cache = not isinstance(query, bytes)
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        elif not isinstance(query, str):
+            query = query.as_string(cursor.connection)
+        statement = query
+        match = _EXECUTE.match(query)
+        if match:
+            with _prepared_text_lock:
+                statement = _prepared_text.get(cursor.connection, {}).get(match.group(1), query)
+        fingerprint = self.fingerprint(statement, cache=cache)
+        rows = max(cursor.rowcount, 0)
+        slow = duration >= self.slow_query_threshold
+
+        with self._lock:
+            entry = self._queries.get(fingerprint)
+            if entry is None:
+                entry = self._queries[fingerprint] = {
+                    "calls": 0, "errors": 0, "slow": 0, "rows": 0, "total_time": 0.0, "max_time": 0.0
+                }
+            entry["calls"] += 1
+            entry["rows"] += rows
+            entry["total_time"] += duration
+            entry["max_time"] = max(entry["max_time"], duration)
+            if failed:
+                entry["errors"] += 1
+            if slow:
+                entry["slow"] += 1
+
+        if slow:
+            self.logger.warning(
+                f"Slow query ({duration * 1000:.1f} ms, {rows} rows): {fingerprint} params={param_shape(params)}"
+            )
+            if self.explain_slow_queries and not failed and fingerprint.upper().startswith("SELECT"):
+                self._log_plan(cursor, query, params)
+
+    def _log_plan(self, cursor, query, params):
+        """
+        Log EXPLAIN (ANALYZE, BUFFERS) for a slow query, inside a savepoint so that a
+        failing EXPLAIN cannot abort the caller's transaction.
+        """
+        connection = cursor.connection
+        if cursor.name or connection.autocommit:
+            return
+        if connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+            return
+        explain_cursor = psycopg2.extensions.cursor(connection)
+        try:
+            explain_cursor.execute("SAVEPOINT explain_slow_query")
+            try:
+                explain_cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+                plan = "\n".join(row[0] for row in explain_cursor.fetchall())
+                explain_cursor.execute("RELEASE SAVEPOINT explain_slow_query")
+                self.logger.warning(f"Plan for slow query:\n{plan}")
+            except psycopg2.Error as e:
+                explain_cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+                self.logger.warning(f"Could not explain slow query: {e}")
+        except psycopg2.Error:
+            pass
+        finally:
+            explain_cursor.close()
+
+    def record_wait(self, duration):
+        """
+        Record the time a caller waited to check out a pooled connection.
+
+        Args:
+            duration (float): Wait time in seconds.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._waits["count"] += 1
+            self._waits["total"] += duration
+            self._waits["max"] = max(self._waits["max"], duration)
+
+    def snapshot(self, limit=None):
+        """
+        Report the aggregated statistics, most expensive statements first.
+
+        Args:
+            limit (int): Report at most this many statements.
+
+        Returns:
+            dict: "queries" maps fingerprints to their stats; "connection_wait" summarizes
+                  pool checkout waits.
+        """
+        with self._lock:
+            queries = [(fingerprint, dict(entry)) for fingerprint, entry in self._queries.items()]
+            waits = dict(self._waits)
+        queries.sort(key=lambda item: item[1]["total_time"], reverse=True)
+        for _, entry in queries:
+            entry["mean_time"] = entry["total_time"] / entry["calls"]
+        waits["mean"] = waits["total"] / waits["count"] if waits["count"] else 0.0
+        return {"queries": dict(queries[:limit]), "connection_wait": waits}
+
+    def dump(self, limit=20):
+        """
+        Log the statistics of the most expensive statements and return them as text.
+
+        Args:
+            limit (int): Number of statements to include.
+
+        Returns:
+            str: The formatted statistics.
+        """
+        snapshot = self.snapshot(limit)
+        lines = []
+        for fingerprint, entry in snapshot["queries"].items():
+            lines.append(
+                f"{entry['total_time'] * 1000:10.1f} ms total  {entry['calls']:8d} calls  "
+                f"{entry['mean_time'] * 1000:8.2f} ms mean  {entry['max_time'] * 1000:8.2f} ms max  "
+                f"{entry['rows']:10d} rows  {entry['slow']:5d} slow  {fingerprint}"
+            )
+        waits = snapshot["connection_wait"]
+        lines.append(
+            f"Connection wait: {waits['count']} checkouts, {waits['mean'] * 1000:.2f} ms mean, "
+            f"{waits['max'] * 1000:.2f} ms max"
+        )
+        text = "\n".join(lines)
+        self.logger.info(f"Query statistics:\n{text}")
+        return text
+
+
+# Process-wide collector fed by every InstrumentedCursor
+QUERY_STATS = QueryStats()
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """
+    A cursor that reports each statement's latency and row count to QUERY_STATS.
+    """
+
+    def execute(self, query, vars=None):
+        if not QUERY_STATS.enabled:
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, vars)
+            failed = False
+            return result
+        finally:
+            QUERY_STATS.observe(self, query, vars, time.perf_counter() - started, failed)
+
+    def executemany(self, query, vars_list):
+        if not QUERY_STATS.enabled:
+            return super().executemany(query, vars_list)
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().executemany(query, vars_list)
+            failed = False
+            return result
+        finally:
+            QUERY_STATS.observe(self, query, None, time.perf_counter() - started, failed)
+
+    def copy_expert(self, sql, file, size=8192):
+        if not QUERY_STATS.enabled:
+            return super().copy_expert(sql, file, size)
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().copy_expert(sql, file, size)
+            failed = False
+            return result
+        finally:
+            QUERY_STATS.observe(self, sql, None, time.perf_counter() - started, failed)
@@ -0,0 +1,196 @@
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+from postgres_pool import get_pool
+
+# Read strategies for picking a replica:
+#   "round_robin"  - rotate through the available replicas
+#   "least_loaded" - the replica with the fewest checked-out and waiting connections
+SELECTION_STRATEGIES = ("round_robin", "least_loaded")
+
+_primary_reads = contextvars.ContextVar("primary_reads", default=False)
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Send every read made inside the with-block to the primary.
+
+    Use it to read your own writes, e.g. right after creating a record that a
+    lagging replica may not have yet.
+    """
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+def replica_configs(db_config, replicas):
+    """
+    Build full connection settings for each replica.
+
+    Args:
+        db_config (dict): The primary's psycopg2.connect arguments.
+        replicas (list): Per-replica overrides, e.g. {"host": "replica1", "port": 5433}.
+
+    Returns:
+        list: One psycopg2.connect argument dict per replica.
+    """
+    return [dict(db_config, **replica) for replica in replicas or ()]
+
+
+class ReplicaSet:
+    """
+    Routes read-only work to read replicas and everything else to the primary.
+
+    A replica that fails to hand out a connection, or whose connection breaks, is
+    skipped for retry_after seconds; with no replica available, reads go to the primary.
+    """
+
+    def __init__(self, primary, replicas=(), selection="round_robin", retry_after=30.0):
+        """
+        Initialize the replica set.
+
+        Args:
+            primary (PostgresPool): Pool of the primary database.
+            replicas (list): PostgresPool instances of the read replicas.
+            selection (str): Replica selection strategy, one of SELECTION_STRATEGIES.
+            retry_after (float): Seconds a failed replica is left out of rotation.
+        """
+        if selection not in SELECTION_STRATEGIES:
+            raise ValueError(f"Unknown replica selection strategy: {selection}")
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.selection = selection
+        self.retry_after = retry_after
+        self._next = itertools.count()
+        self._down_until = {}
+        self._lock = threading.Lock()
+        self._stats = {"primary_reads": 0, "replica_reads": 0, "replica_failures": 0}
+
+    @classmethod
+    def from_config(cls, db_config, replicas=None, selection="round_robin", pool=None, **pool_options):
+        """
+        Build a replica set over the shared pools of a primary and its replicas.
+
+        Args:
+            db_config (dict): The primary's psycopg2.connect arguments.
+            replicas (list): Per-replica overrides of db_config.
+            selection (str): Replica selection strategy.
+            pool (PostgresPool): The primary's pool, if already known.
+            **pool_options: PostgresPool settings for pools created here.
+
+        Returns:
+            ReplicaSet: The replica set.
+        """
+        primary = pool or get_pool(db_config, **pool_options)
+        replica_pools = [get_pool(config, **pool_options) for config in replica_configs(db_config, replicas)]
+        return cls(primary, replica_pools, selection)
+
+    def _choose(self):
+        """
+        Pick the replica for the next read.
+
+        Returns:
+            PostgresPool: A replica pool, or None to read from the primary.
+        """
+        if not self.replicas or _primary_reads.get():
+            return None
+        now = time.monotonic()
+        available = [pool for pool in self.replicas if self._down_until.get(pool, 0.0) <= now]
+        if not available:
+            return None
+        if self.selection == "least_loaded":
+            return min(available, key=lambda pool: pool.load())
+        return available[next(self._next) % len(available)]
+
+    def _mark_down(self, pool):
+        """Take a failed replica out of rotation for retry_after seconds."""
+        with self._lock:
+            self._down_until[pool] = time.monotonic() + self.retry_after
+            self._stats["replica_failures"] += 1
+
+    def _count(self, key):
+        """Increment one of the routing counters."""
+        with self._lock:
+            self._stats[key] += 1
+
+    @contextmanager
+    def read_connection(self):
+        """
+        Check out a connection for read-only work, from a replica when one is available.
+
+        Falls back to the primary when the replica cannot hand out a connection. A
+        replica failing during the block is taken out of rotation, but the error still
+        propagates; use run_read() to have the work retried on the primary.
+
+        Yields:
+            psycopg2 connection: The checked-out connection.
+        """
+        pool = self._choose()
+        with ExitStack() as stack:
+            conn = None
+            if pool is not None:
+                try:
+                    conn = stack.enter_context(pool.connection())
+                except (PoolError, psycopg2.OperationalError):
+                    self._mark_down(pool)
+            if conn is None:
+                self._count("primary_reads")
+                yield stack.enter_context(self.primary.connection())
+                return
+
+            self._count("replica_reads")
+            try:
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if not isinstance(e, psycopg2.extensions.QueryCanceledError):
+                    self._mark_down(pool)
+                raise
+
+    def run_read(self, operation):
+        """
+        Run read-only work on a replica, retrying it on the primary if the replica fails.
+
+        Args:
+            operation (callable): Takes a connection and returns the result.
+
+        Returns:
+            The value returned by operation.
+        """
+        pool = self._choose()
+        if pool is not None:
+            try:
+                with pool.connection() as conn:
+                    result = operation(conn)
+                self._count("replica_reads")
+                return result
+            except psycopg2.extensions.QueryCanceledError:
+                raise
+            except (PoolError, psycopg2.OperationalError, psycopg2.InterfaceError):
+                self._mark_down(pool)
+
+        self._count("primary_reads")
+        with self.primary.connection() as conn:
+            return operation(conn)
+
+    def stats(self):
+        """
+        Report how reads were routed.
+
+        Returns:
+            dict: Read counts, replica failures and the replicas currently out of rotation.
+        """
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            stats["replicas_down"] = sum(1 for until in self._down_until.values() if until > now)
+        stats["replicas"] = len(self.replicas)
+        return stats
@@ -1,16 +1,27 @@
-import psycopg2
 from psycopg2 import sql
 import hashlib
 import time
+from postgres_pool import get_pool, execute_prepared
+from replicas import ReplicaSet, read_from_primary
 
 class SessionManager:
-    def __init__(self, db_config):
+    def __init__(self, db_config, pool=None, prepare_statements=True, replicas=None, replica_selection="round_robin"):
         self.db_config = db_config
+        self.pool = pool or get_pool(db_config)
+        self.prepare_statements = prepare_statements
+        # Session lookups go to the read replicas, if any are configured
+        self.replicas = ReplicaSet.from_config(db_config, replicas, replica_selection, pool=self.pool)
 
     def _get_connection(self):
-        """Establish a connection to the database."""
-        connection = psycopg2.connect(**self.db_config)
-        return connection
+        """Check out a connection from the shared pool; it is returned when the with-block exits."""
+        return self.pool.connection()
+
+    def _execute(self, cursor, query, params):
+        """Execute a session query, prepared once per pooled connection unless disabled."""
+        if self.prepare_statements:
+            execute_prepared(cursor, query, params)
+        else:
+            cursor.execute(query, params)
 
     def create_session(self, username, expiration_duration=1800):
         """Create a session for a user and return the session token."""
@@ -24,7 +35,7 @@ class SessionManager:
             """)
             with self._get_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute(query, (session_token, username, expiration_time))
+                    self._execute(cursor, query, (session_token, username, expiration_time))
                     conn.commit()
                     print(f"Session created successfully for {username}.")
                     return session_token
@@ -38,23 +49,30 @@ class SessionManager:
             query = sql.SQL("""
                 SELECT username, expiration_time FROM sessions WHERE session_token = %s
             """)
-            with self._get_connection() as conn:
+
+            def lookup(conn):
                 with conn.cursor() as cursor:
-                    cursor.execute(query, (session_token,))
-                    result = cursor.fetchone()
+                    self._execute(cursor, query, (session_token,))
+                    return cursor.fetchone()
 
-                    if result:
-                        username, expiration_time = result
-                        # Check if the session has expired
-                        if int(time.time()) <= expiration_time:
-                            return username
-                        else:
-                            print("Session expired.")
-                            self.logout(session_token)  # Optional: Automatically logout after expiration
-                            return None
-                    else:
-                        print("Session not found.")
-                        return None
+            result = self.replicas.run_read(lookup)
+            if not result and self.replicas.replicas:
+                # A session created moments ago may not have reached the replica yet
+                with read_from_primary():
+                    result = self.replicas.run_read(lookup)
+
+            if result:
+                username, expiration_time = result
+                # Check if the session has expired
+                if int(time.time()) <= expiration_time:
+                    return username
+                else:
+                    print("Session expired.")
+                    self.logout(session_token)  # Optional: Automatically logout after expiration
+                    return None
+            else:
+                print("Session not found.")
+                return None
         except Exception as e:
             print(f"An error occurred while validating the session: {e}")
             return None
@@ -67,12 +85,27 @@ class SessionManager:
             """)
             with self._get_connection() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute(query, (session_token,))
+                    self._execute(cursor, query, (session_token,))
                     conn.commit()
                     print("Session deleted successfully.")
         except Exception as e:
             print(f"An error occurred while logging out: {e}")
 
+    def delete_expired_sessions(self):
+        """Delete every expired session and return how many were removed."""
+        try:
+            query = sql.SQL("""
+                DELETE FROM sessions WHERE expiration_time < %s
+            """)
+            with self._get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, (int(time.time()),))
+                    conn.commit()
+                    return cursor.rowcount
+        except Exception as e:
+            print(f"An error occurred while deleting expired sessions: {e}")
+            return 0
+
     def get_user_data(self, session_token):
         """Fetch user data only if the session is valid."""
         username = self.validate_session(session_token)
@@ -83,7 +116,7 @@ class SessionManager:
                 """)
                 with self._get_connection() as conn:
                     with conn.cursor() as cursor:
-                        cursor.execute(query, (username,))
+                        self._execute(cursor, query, (username,))
                         result = cursor.fetchone()
                         if result:
                             print(f"User Data: {result}")
@@ -0,0 +1,116 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLitePool:
+    """
+    A thread-safe pool of SQLite connections configured for concurrent access.
+
+    Every connection runs in WAL mode, so readers never block each other or the
+    writer, and with synchronous=NORMAL, which is durable under WAL while avoiding
+    an fsync per commit. A connection is only ever used by one thread at a time.
+    """
+
+    def __init__(self, db_path, max_connections=8, busy_timeout=5.0, cache_size_kib=16384, timeout=None):
+        """
+        Initialize the pool. Connections are opened lazily, up to max_connections.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+            max_connections (int): Maximum number of open connections.
+            busy_timeout (float): Seconds a writer waits for a competing write lock.
+            cache_size_kib (int): Page cache size per connection, in KiB.
+            timeout (float): Seconds to wait for a free connection, or None to wait forever.
+        """
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self.busy_timeout = busy_timeout
+        self.cache_size_kib = cache_size_kib
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        """
+        Open and configure a new connection.
+
+        Returns:
+            sqlite3.Connection: The configured connection.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _acquire(self):
+        """
+        Take an idle connection, opening a new one while below max_connections.
+
+        Returns:
+            sqlite3.Connection: A connection owned by the caller until released.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("The connection pool is closed.")
+            if len(self._connections) < self.max_connections:
+                conn = self._connect()
+                self._connections.append(conn)
+                return conn
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"No SQLite connection became available within {self.timeout} seconds."
+            ) from None
+
+    def _release(self, conn):
+        """Return a connection to the pool, or close it if the pool was closed meanwhile."""
+        with self._lock:
+            if self._closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for the duration of a with-block.
+
+        The transaction is committed when the block succeeds and rolled back when it
+        raises.
+
+        Yields:
+            sqlite3.Connection: The checked-out connection.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """Close idle connections now; connections still checked out close on release."""
+        with self._lock:
+            self._closed = True
+            self._connections = []
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
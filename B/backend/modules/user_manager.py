@@ -1,21 +1,24 @@
 import sqlite3
 import hashlib
 import os
+from sqlite_pool import SQLitePool
 
 class UserManager:
-    def __init__(self, db_path="F:\\B\\backend\\data\\ghnet.db"):
+    def __init__(self, db_path="F:\\B\\backend\\data\\ghnet.db", pool=None):
         """
         Initialize the UserManager with a database connection.
         
         Args:
             db_path (str): Path to the SQLite database file.
+            pool (SQLitePool): Shared connection pool; one is created for db_path if omitted.
         """
         self.db_path = db_path
+        self.pool = pool or SQLitePool(db_path)
         self._initialize_database()
 
     def _initialize_database(self):
         """Initialize the users table if it doesn't already exist."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -67,7 +70,7 @@ class UserManager:
             str: Success or error message.
         """
         password_hash, salt = self._hash_password(password)
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             try:
                 cursor.execute("""
@@ -90,7 +93,7 @@ class UserManager:
         Returns:
             bool: True if authentication is successful, False otherwise.
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT password_hash, salt 
@@ -113,7 +116,7 @@ class UserManager:
         Returns:
             str: Success or error message.
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM users WHERE username = ?", (username,))
             if cursor.rowcount > 0:
@@ -129,7 +132,7 @@ class UserManager:
         Returns:
             list: A list of usernames.
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT username FROM users")
             return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,298 @@
+"""
+Load generator and throughput benchmark for the NetworkManager.
+
+Drives many concurrent connections speaking the framed protocol, keeps a fixed
+number of requests in flight per connection, and reports throughput and latency
+percentiles. Results can be saved as JSON and compared against a baseline to
+catch regressions between serving modes or releases.
+
+Examples:
+    python benchmark.py --start-server --mode event_loop --connections 200 --pipeline 8
+    python benchmark.py --port 8080 --duration 30 --save threaded.json
+    python benchmark.py --start-server --mode event_loop --compare threaded.json
+    python benchmark.py --start-server --host unix:/tmp/network_manager.sock
+"""
+import argparse
+import array
+import json
+import multiprocessing
+import selectors
+import socket
+import sys
+import time
+from collections import deque
+from framing import FrameParser, encode_frame
+
+
+def connect(host, port):
+    """
+    Opens a client connection; a host of the form "unix:<path>" selects a Unix domain socket.
+    :return: The connected socket.
+    """
+    if host.startswith("unix:"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(host[len("unix:"):])
+        return sock
+    sock = socket.create_connection((host, port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def run_client(host, port, connections, message_size, pipeline, duration, warmup):
+    """
+    Runs one client process: drives its share of the connections until the deadline.
+    :return: A dict with the measured latencies (seconds, as an array) and counters.
+    """
+    selector = selectors.DefaultSelector()
+    frame = encode_frame(b"x" * message_size)
+    latencies = array.array("d")
+    errors = 0
+
+    states = []
+    for _ in range(connections):
+        try:
+            sock = connect(host, port)
+        except OSError:
+            errors += 1
+            continue
+        sock.setblocking(False)
+        state = {"sock": sock, "parser": FrameParser(), "sent_at": deque(), "outbuf": bytearray()}
+        selector.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, data=state)
+        states.append(state)
+
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    # Fill every pipeline before entering the loop
+    for state in states:
+        for _ in range(pipeline):
+            state["sent_at"].append(time.perf_counter())
+            state["outbuf"] += frame
+
+    open_connections = len(states)
+    while open_connections:
+        now = time.perf_counter()
+        if now > deadline + 5:
+            break  # Give outstanding responses a bounded grace period
+        for key, mask in selector.select(timeout=1):
+            state = key.data
+            sock = state["sock"]
+            try:
+                if mask & selectors.EVENT_WRITE and state["outbuf"]:
+                    sent = sock.send(state["outbuf"])
+                    del state["outbuf"][:sent]
+                if mask & selectors.EVENT_READ:
+                    data = sock.recv(65536)
+                    if not data:
+                        raise ConnectionError("server closed the connection")
+                    now = time.perf_counter()
+                    for _ in state["parser"].feed(data):
+                        sent_at = state["sent_at"].popleft()
+                        if now >= measure_from and sent_at <= deadline:
+                            latencies.append(now - sent_at)
+                        if now < deadline:
+                            state["sent_at"].append(now)
+                            state["outbuf"] += frame
+            except (OSError, IndexError):
+                errors += 1
+                selector.unregister(sock)
+                sock.close()
+                open_connections -= 1
+                continue
+
+            if now >= deadline and not state["sent_at"]:
+                selector.unregister(sock)
+                sock.close()
+                open_connections -= 1
+                continue
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if state["outbuf"] else 0)
+            selector.modify(sock, events, data=state)
+
+    for key in list(selector.get_map().values()):
+        key.fileobj.close()
+    selector.close()
+    return {"latencies": latencies, "errors": errors}
+
+
+def _client_entry(args, result_queue):
+    """Process entry point wrapping run_client."""
+    result_queue.put(run_client(*args))
+
+
+def _serve(host, port, mode, ready):
+    """Process entry point running a local framed NetworkManager until terminated."""
+    from network_manager import NetworkManager
+    if host.startswith("unix:"):
+        manager = NetworkManager(None, port, mode=mode, framed=True, unix_socket_path=host[len("unix:"):])
+    else:
+        manager = NetworkManager(host, port, mode=mode, framed=True)
+    manager.start_server()
+    ready.set()
+    try:
+        while True:
+            time.sleep(3600)
+    finally:
+        manager.stop_server()
+
+
+def percentile(sorted_values, fraction):
+    """Returns the value at the given fraction of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_benchmark(host, port, connections=50, message_size=64, pipeline=1, duration=10.0,
+                  warmup=1.0, processes=1):
+    """
+    Runs the load generator and summarizes the results.
+    :param host: Server host.
+    :param port: Server port.
+    :param connections: Total concurrent connections, spread over the client processes.
+    :param message_size: Payload size of each request, in bytes.
+    :param pipeline: Requests kept in flight per connection.
+    :param duration: Measured duration, in seconds.
+    :param warmup: Seconds of traffic before measurement starts.
+    :param processes: Number of client processes generating load.
+    :return: A dict with the configuration, throughput and latency percentiles.
+    """
+    result_queue = multiprocessing.Queue()
+    workers = []
+    for index in range(processes):
+        share = connections // processes + (1 if index < connections % processes else 0)
+        args = (host, port, share, message_size, pipeline, duration, warmup)
+        worker = multiprocessing.Process(target=_client_entry, args=(args, result_queue))
+        worker.start()
+        workers.append(worker)
+
+    latencies = []
+    errors = 0
+    for _ in workers:
+        result = result_queue.get()
+        latencies.extend(result["latencies"])
+        errors += result["errors"]
+    for worker in workers:
+        worker.join()
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "config": {
+            "connections": connections,
+            "message_size": message_size,
+            "pipeline": pipeline,
+            "duration": duration,
+            "processes": processes,
+        },
+        "messages": count,
+        "errors": errors,
+        "throughput_per_s": count / duration if duration else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / count * 1000 if count else 0.0,
+            "p50": percentile(latencies, 0.5) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "p999": percentile(latencies, 0.999) * 1000,
+            "max": (latencies[-1] if latencies else 0.0) * 1000,
+        },
+    }
+
+
+def print_results(results):
+    """Prints a benchmark summary."""
+    config = results["config"]
+    print(f"connections={config['connections']} message_size={config['message_size']} "
+          f"pipeline={config['pipeline']} duration={config['duration']}s processes={config['processes']}")
+    print(f"messages:   {results['messages']} ({results['errors']} errors)")
+    print(f"throughput: {results['throughput_per_s']:.0f} msg/s")
+    latency = results["latency_ms"]
+    print(f"latency:    mean={latency['mean']:.3f}ms p50={latency['p50']:.3f}ms p99={latency['p99']:.3f}ms "
+          f"p999={latency['p999']:.3f}ms max={latency['max']:.3f}ms")
+
+
+def compare_results(results, baseline, tolerance):
+    """
+    Prints the change against a baseline and reports regressions.
+    :param results: The current results.
+    :param baseline: Previously saved results.
+    :param tolerance: Allowed relative regression, e.g. 0.1 for 10%.
+    :return: True if throughput and p99 latency are within tolerance.
+    """
+    ok = True
+
+    def change(current, previous):
+        return (current - previous) / previous if previous else 0.0
+
+    throughput_change = change(results["throughput_per_s"], baseline["throughput_per_s"])
+    print(f"throughput: {baseline['throughput_per_s']:.0f} -> {results['throughput_per_s']:.0f} msg/s "
+          f"({throughput_change:+.1%})")
+    if throughput_change < -tolerance:
+        ok = False
+
+    for key in ("p50", "p99", "p999"):
+        previous = baseline["latency_ms"][key]
+        current = results["latency_ms"][key]
+        latency_change = change(current, previous)
+        print(f"{key}: {previous:.3f} -> {current:.3f} ms ({latency_change:+.1%})")
+        if key == "p99" and latency_change > tolerance:
+            ok = False
+
+    print("no regression" if ok else "REGRESSION detected")
+    return ok
+
+
+def main(argv=None):
+    """Command-line entry point; returns the process exit code."""
+    parser = argparse.ArgumentParser(description="Benchmark the NetworkManager framed protocol.")
+    parser.add_argument("--host", default="127.0.0.1", help='server host, or "unix:<path>" for a Unix socket')
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--message-size", type=int, default=64)
+    parser.add_argument("--pipeline", type=int, default=1, help="requests in flight per connection")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--processes", type=int, default=1, help="client processes generating load")
+    parser.add_argument("--start-server", action="store_true",
+                        help="run a local framed NetworkManager in a separate process")
+    parser.add_argument("--mode", default="threaded", help="serving mode for --start-server")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against results saved in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.start_server:
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=_serve, args=(args.host, args.port, args.mode, ready), daemon=True)
+        server.start()
+        if not ready.wait(10):
+            print("Server failed to start.")
+            return 1
+
+    try:
+        results = run_benchmark(args.host, args.port, args.connections, args.message_size, args.pipeline,
+                                args.duration, args.warmup, args.processes)
+    finally:
+        if server:
+            server.terminate()
+            server.join()
+
+    if args.start_server:
+        results["config"]["mode"] = args.mode
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=4)
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            baseline = json.load(file)
+        if not compare_results(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
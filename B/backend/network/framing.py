@@ -0,0 +1,78 @@
+import struct
+
+# Every frame is a 4-byte big-endian payload length followed by the payload bytes.
+FRAME_HEADER = struct.Struct("!I")
+DEFAULT_MAX_FRAME_SIZE = 16 * 1024 * 1024  # 16 MiB
+
+
+class FrameError(ValueError):
+    """Raised when a peer sends a frame that violates the wire protocol."""
+
+
+def encode_frame(payload):
+    """
+    Encodes a payload as a single length-prefixed frame.
+    :param payload: The payload as bytes (or a str, which is UTF-8 encoded).
+    :return: The framed bytes ready to be sent.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+class FrameParser:
+    """
+    Incremental parser for length-prefixed frames.
+
+    Complete frames are sliced straight out of the data handed to feed(), so a
+    read holding many pipelined frames is parsed without intermediate copies.
+    Only the trailing partial frame is kept, in a bytearray that grows in place
+    until the frame is complete.
+    """
+
+    def __init__(self, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+        """
+        Initialize the parser.
+        :param max_frame_size: Largest payload size accepted from the peer, in bytes.
+        """
+        self.max_frame_size = max_frame_size
+        self._pending = bytearray()
+
+    @property
+    def pending_bytes(self):
+        """Number of buffered bytes belonging to a frame that is not complete yet."""
+        return len(self._pending)
+
+    def feed(self, data):
+        """
+        Parses newly received bytes.
+        :param data: A bytes-like object (typically a memoryview over a receive buffer).
+        :return: A list of complete frame payloads, as bytes.
+        :raises FrameError: If a frame header announces a payload above max_frame_size.
+        """
+        if self._pending:
+            self._pending += data
+            buffer = self._pending
+        else:
+            buffer = data
+
+        frames = []
+        offset = 0
+        with memoryview(buffer) as view:
+            total = len(view)
+            while total - offset >= FRAME_HEADER.size:
+                (length,) = FRAME_HEADER.unpack_from(view, offset)
+                if length > self.max_frame_size:
+                    raise FrameError(f"Frame of {length} bytes exceeds limit of {self.max_frame_size}")
+                end = offset + FRAME_HEADER.size + length
+                if end > total:
+                    break  # Wait for the rest of this frame
+                frames.append(bytes(view[offset + FRAME_HEADER.size:end]))
+                offset = end
+
+            if buffer is not self._pending and offset < total:
+                self._pending = bytearray(view[offset:])
+
+        if buffer is self._pending:
+            del self._pending[:offset]
+        return frames
@@ -0,0 +1,189 @@
+import bisect
+import threading
+import time
+
+# Latency bucket upper bounds in seconds: 1-2-5 steps from 10 microseconds to 100 seconds.
+LATENCY_BUCKETS = tuple(m * 10.0 ** e for e in range(-5, 2) for m in (1, 2, 5)) + (100.0,)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles are reported as bucket upper bounds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Adds one observation, in seconds."""
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """
+        Returns the upper bound of the bucket holding the given fraction of observations.
+        :param fraction: Percentile as a fraction, e.g. 0.99.
+        :return: Latency in seconds, or 0.0 when empty.
+        """
+        if not self.count:
+            return 0.0
+        threshold = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= threshold:
+                return min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        """Returns count, mean, max and p50/p90/p99/p999 latencies in milliseconds."""
+        summary = {"count": self.count, "mean_ms": 0.0, "max_ms": self.max * 1000}
+        if self.count:
+            summary["mean_ms"] = self.total / self.count * 1000
+        for name, fraction in (("p50_ms", 0.5), ("p90_ms", 0.9), ("p99_ms", 0.99), ("p999_ms", 0.999)):
+            summary[name] = self.percentile(fraction) * 1000
+        return summary
+
+
+class NetworkMetrics:
+    """Counters and latency histograms for the NetworkManager."""
+
+    enabled = True
+
+    def __init__(self, rate_window=60):
+        """
+        Initialize the metrics.
+        :param rate_window: Length, in seconds, of the sliding window used for the accept rate.
+        """
+        self.rate_window = rate_window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clears every counter and histogram."""
+        with self._lock:
+            self.started_at = time.monotonic()
+            self.connections_accepted = 0
+            self.connections_closed = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.messages = 0
+            self.errors = 0
+            self.message_latency = LatencyHistogram()
+            self._accept_buckets = [0] * self.rate_window
+            self._accept_seconds = [0] * self.rate_window
+
+    def connection_opened(self):
+        """Counts an accepted connection."""
+        now = int(time.monotonic())
+        slot = now % self.rate_window
+        with self._lock:
+            self.connections_accepted += 1
+            if self._accept_seconds[slot] != now:
+                self._accept_seconds[slot] = now
+                self._accept_buckets[slot] = 0
+            self._accept_buckets[slot] += 1
+
+    def connection_closed(self):
+        """Counts a closed connection."""
+        with self._lock:
+            self.connections_closed += 1
+
+    def bytes_received(self, count):
+        """Adds to the inbound byte counter."""
+        with self._lock:
+            self.bytes_in += count
+
+    def bytes_sent(self, count):
+        """Adds to the outbound byte counter."""
+        with self._lock:
+            self.bytes_out += count
+
+    def message_handled(self, seconds):
+        """Records the handling time of one message."""
+        with self._lock:
+            self.messages += 1
+            self.message_latency.record(seconds)
+
+    def error(self):
+        """Counts a connection error."""
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self):
+        """
+        Returns every metric as a plain dict.
+        :return: Counters, uptime, accept rate and message latency summary.
+        """
+        now = time.monotonic()
+        with self._lock:
+            uptime = now - self.started_at
+            window_start = int(now) - self.rate_window
+            recent_accepts = sum(count for second, count in zip(self._accept_seconds, self._accept_buckets)
+                                 if second > window_start)
+            return {
+                "uptime_s": uptime,
+                "connections_accepted": self.connections_accepted,
+                "connections_closed": self.connections_closed,
+                "accept_rate_per_s": recent_accepts / min(self.rate_window, max(uptime, 1)),
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "messages": self.messages,
+                "messages_per_s": self.messages / uptime if uptime else 0.0,
+                "errors": self.errors,
+                "message_latency": self.message_latency.snapshot(),
+            }
+
+
+class NullMetrics:
+    """Drop-in replacement used when metrics are disabled; every hook is a no-op."""
+
+    enabled = False
+
+    def reset(self):
+        pass
+
+    def connection_opened(self):
+        pass
+
+    def connection_closed(self):
+        pass
+
+    def bytes_received(self, count):
+        pass
+
+    def bytes_sent(self, count):
+        pass
+
+    def message_handled(self, seconds):
+        pass
+
+    def error(self):
+        pass
+
+    def snapshot(self):
+        return {}
+
+
+def format_metrics(snapshot):
+    """
+    Renders a metrics snapshot as human-readable lines.
+    :param snapshot: A dict as returned by NetworkManager.get_metrics().
+    :return: The formatted text.
+    """
+    lines = []
+    for key, value in snapshot.items():
+        if isinstance(value, dict):
+            lines.append(f"{key}:")
+            lines.extend(f"  {name}: {item:.3f}" if isinstance(item, float) else f"  {name}: {item}"
+                         for name, item in value.items())
+        elif isinstance(value, float):
+            lines.append(f"{key}: {value:.3f}")
+        else:
+            lines.append(f"{key}: {value}")
+    return "\n".join(lines)
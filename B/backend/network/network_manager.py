@@ -1,117 +1,826 @@
-import socket
-import threading
-import logging
-import os
-
-class NetworkManager:
-    def __init__(self, host="127.0.0.1", port=8080):
-        """
-        Initialize the NetworkManager to manage server and client communication.
-        :param host: Host IP address to bind the server.
-        :param port: Port number to bind the server.
-        """
-        self.host = host
-        self.port = port
-        self.server_socket = None
-        self.client_threads = []
-        self.logger = self.setup_logger()
-
-    def setup_logger(self):
-        """Sets up logging for the NetworkManager."""
-        logger = logging.getLogger("NetworkManagerLogger")
-        logger.setLevel(logging.INFO)
-
-        # Ensure log directory exists
-        log_dir = "F:/B/logs"
-        os.makedirs(log_dir, exist_ok=True)
-
-        log_file = os.path.join(log_dir, "network_manager.log")
-        file_handler = logging.FileHandler(log_file)
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-
-        return logger
-
-    def start_server(self):
-        """Starts the server and listens for incoming connections."""
-        try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
-            self.logger.info(f"Server started on {self.host}:{self.port}")
-
-            # Start a thread to accept incoming connections
-            threading.Thread(target=self.accept_connections, daemon=True).start()
-        except Exception as e:
-            self.logger.error(f"Error starting server: {e}")
-            raise
-
-    def accept_connections(self):
-        """Accepts incoming client connections."""
-        self.logger.info("Waiting for client connections...")
-        while True:
-            try:
-                client_socket, client_address = self.server_socket.accept()
-                self.logger.info(f"Connection established with {client_address}")
-
-                # Start a thread to handle the client
-                client_thread = threading.Thread(
-                    target=self.handle_client, 
-                    args=(client_socket, client_address), 
-                    daemon=True
-                )
-                client_thread.start()
-                self.client_threads.append(client_thread)
-            except Exception as e:
-                self.logger.error(f"Error accepting connection: {e}")
-
-    def handle_client(self, client_socket, client_address):
-        """
-        Handles communication with a connected client.
-        :param client_socket: The socket object for the connected client.
-        :param client_address: The address of the connected client.
-        """
-        try:
-            while True:
-                # Receive message from client
-                message = client_socket.recv(1024).decode('utf-8')
-                if not message:
-                    break  # Client disconnected
-                self.logger.info(f"Received from {client_address}: {message}")
-
-                # Send acknowledgment back to client
-                response = f"Message received: {message}"
-                client_socket.send(response.encode('utf-8'))
-        except Exception as e:
-            self.logger.error(f"Error handling client {client_address}: {e}")
-        finally:
-            client_socket.close()
-            self.logger.info(f"Connection closed with {client_address}")
-
-    def stop_server(self):
-        """Stops the server and closes all client connections."""
-        self.logger.info("Stopping server...")
-        try:
-            # Close all client connections
-            for thread in self.client_threads:
-                thread.join(timeout=1)
-
-            if self.server_socket:
-                self.server_socket.close()
-                self.logger.info("Server socket closed.")
-        except Exception as e:
-            self.logger.error(f"Error stopping server: {e}")
-
-if __name__ == "__main__":
-    # Example usage of NetworkManager
-    network_manager = NetworkManager(host="127.0.0.1", port=8080)
-
-    try:
-        network_manager.start_server()
-        while True:
-            pass  # Keep the server running
-    except KeyboardInterrupt:
-        network_manager.stop_server()
-    except Exception as e:
-        network_manager.logger.error(f"Unexpected error: {e}")
+import socket
+import signal
+import selectors
+import threading
+import logging
+import codecs
+import queue
+import time
+import os
+from framing import FrameParser, FrameError, encode_frame, DEFAULT_MAX_FRAME_SIZE
+from metrics import NetworkMetrics, NullMetrics, format_metrics
+from async_logging import setup_async_logging
+
+SERVING_MODES = ("threaded", "event_loop")
+BUSY_RESPONSE = "BUSY"
+
+
+class ClientConnection:
+    """Per-connection state shared by the serving modes."""
+
+    __slots__ = ("sock", "address", "protocol", "outbuf", "events", "last_activity", "busy")
+
+    def __init__(self, sock, address, protocol):
+        self.sock = sock
+        self.address = address
+        self.protocol = protocol
+        self.outbuf = bytearray()
+        self.events = selectors.EVENT_READ
+        self.last_activity = time.monotonic()
+        self.busy = False
+
+    def shutdown(self, how=socket.SHUT_RDWR):
+        """Shuts the socket down, waking any thread blocked on it, without closing it."""
+        try:
+            self.sock.shutdown(how)
+        except OSError:
+            pass
+
+
+def create_listeners(host, port, unix_socket_path=None, backlog=128, reuse_port=False):
+    """
+    Binds the TCP and Unix domain listening sockets for a server.
+    :param host: Host IP address to bind, or None for no TCP listener.
+    :param port: Port number to bind.
+    :param unix_socket_path: Also listen on this AF_UNIX socket path.
+    :param backlog: Listen backlog passed to listen().
+    :param reuse_port: Bind with SO_REUSEPORT.
+    :return: The list of listening sockets.
+    """
+    listeners = []
+    try:
+        if host is not None:
+            tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listeners.append(tcp_socket)
+            if os.name != "nt":
+                # Lets a restarted server rebind while old connections sit in TIME_WAIT
+                tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            tcp_socket.bind((host, port))
+            tcp_socket.listen(backlog)
+
+        if unix_socket_path:
+            # A stale socket file left by a previous run would make bind() fail
+            if os.path.exists(unix_socket_path):
+                os.unlink(unix_socket_path)
+            unix_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listeners.append(unix_socket)
+            unix_socket.bind(unix_socket_path)
+            unix_socket.listen(backlog)
+    except Exception:
+        for listener in listeners:
+            listener.close()
+        raise
+    return listeners
+
+
+def close_listeners(listeners, unix_socket_path=None):
+    """
+    Closes listening sockets made by create_listeners and removes the Unix socket file.
+    :param listeners: The listening sockets.
+    :param unix_socket_path: The AF_UNIX socket path they were bound with, if any.
+    """
+    for listener in listeners:
+        listener.close()
+    if listeners and unix_socket_path and os.path.exists(unix_socket_path):
+        os.unlink(unix_socket_path)
+
+
+class NetworkManager:
+    def __init__(self, host="127.0.0.1", port=8080, mode="threaded", framed=False,
+                 max_frame_size=DEFAULT_MAX_FRAME_SIZE, recv_buffer_size=65536,
+                 max_workers=None, queue_depth=0, backlog=128, reuse_port=False,
+                 message_handler=None, idle_timeout=None, keepalive=False, keepalive_idle=60,
+                 keepalive_interval=10, keepalive_count=5, drain_timeout=5.0, metrics=False,
+                 unix_socket_path=None, log_queue_size=10000, log_overflow="drop",
+                 send_high_water=1048576, send_low_water=262144):
+        """
+        Initialize the NetworkManager to manage server and client communication.
+        :param host: Host IP address to bind the server. None disables the TCP listener
+                     (requires unix_socket_path).
+        :param port: Port number to bind the server.
+        :param mode: Serving mode, either "threaded" (one thread per client)
+                     or "event_loop" (all clients multiplexed on one thread).
+        :param framed: If True, messages and responses are length-prefixed frames
+                       (see framing.py); otherwise every read is treated as one message.
+        :param max_frame_size: Largest frame payload accepted from a client, in bytes.
+        :param recv_buffer_size: Size of the reusable receive buffer, in bytes.
+        :param max_workers: Threaded mode only. Number of pooled worker threads serving
+                            connections; None keeps one dedicated thread per client.
+        :param queue_depth: Threaded mode only. Connections allowed to wait for a free
+                            worker; beyond that new clients get a "BUSY" response.
+        :param backlog: Listen backlog passed to listen().
+        :param reuse_port: Bind with SO_REUSEPORT so several processes can share the
+                           same host/port and let the kernel balance connections.
+        :param message_handler: Optional callable(message, client_address) returning the
+                                response string, e.g. RequestRouter.dispatch. Defaults
+                                to acknowledging every message.
+        :param idle_timeout: Seconds without client activity after which a connection is
+                             closed by the reaper. None disables idle reaping.
+        :param keepalive: Enable TCP keepalive probes on client connections.
+        :param keepalive_idle: Seconds of idleness before the first keepalive probe.
+        :param keepalive_interval: Seconds between keepalive probes.
+        :param keepalive_count: Unanswered probes before the kernel drops the connection.
+        :param drain_timeout: Global deadline, in seconds, for in-flight messages to finish
+                              when stop_server drains the server.
+        :param metrics: Collect traffic counters and message latency histograms (see
+                        get_metrics). When False the hooks are no-ops.
+        :param unix_socket_path: Also listen on this AF_UNIX socket path, so local
+                                 clients skip the TCP loopback stack. Connections on it
+                                 go through exactly the same handling path.
+        :param log_queue_size: Log records buffered for the background log writer.
+        :param log_overflow: What to do when that buffer is full: "drop", "block" or
+                             "sample" (see async_logging.py).
+        :param send_high_water: Event-loop mode only. Once this many response bytes are
+                                waiting for a client, the server stops reading from it.
+        :param send_low_water: Event-loop mode only. Reading resumes once the pending
+                               responses have drained to this many bytes.
+        """
+        if mode not in SERVING_MODES:
+            raise ValueError(f"Unknown serving mode: {mode}")
+        if host is None and not unix_socket_path:
+            raise ValueError("Either host or unix_socket_path must be set")
+        self.host = host
+        self.port = port
+        self.mode = mode
+        self.framed = framed
+        self.max_frame_size = max_frame_size
+        self.recv_buffer_size = recv_buffer_size
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.backlog = backlog
+        self.reuse_port = reuse_port
+        self.message_handler = message_handler
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.keepalive_idle = keepalive_idle
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count = keepalive_count
+        self.drain_timeout = drain_timeout
+        self.metrics = NetworkMetrics() if metrics else NullMetrics()
+        self.unix_socket_path = unix_socket_path
+        self.server_socket = None
+        self.listen_sockets = []
+        self.client_threads = []
+        self.connections = {}
+        self.log_queue_size = log_queue_size
+        self.log_overflow = log_overflow
+        self.send_high_water = send_high_water
+        self.send_low_water = min(send_low_water, send_high_water)
+        self.logger = self.setup_logger()
+
+        self._running = False
+        self._stop_event = threading.Event()
+        self._drain_deadline = None
+        self._reaper_thread = None
+        self._accept_thread = None
+        self._accepting = False
+        self._listeners_released = threading.Event()
+        self._connections_lock = threading.Lock()
+        self._selector = None
+        self._loop_thread = None
+        self._wakeup_reader = None
+        self._wakeup_writer = None
+        self._recv_buffer = bytearray(recv_buffer_size)
+        self._workers = []
+        self._connection_queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {"accepted": 0, "active": 0, "queued": 0, "rejected": 0}
+
+    def setup_logger(self):
+        """Sets up logging for the NetworkManager; file writes happen on a background thread."""
+        logger = logging.getLogger("NetworkManagerLogger")
+        logger.setLevel(logging.INFO)
+
+        # Ensure log directory exists
+        log_dir = "F:/B/logs"
+        os.makedirs(log_dir, exist_ok=True)
+
+        log_file = os.path.join(log_dir, "network_manager.log")
+        file_handler = logging.FileHandler(log_file)
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        file_handler.setFormatter(formatter)
+        setup_async_logging(logger, [file_handler], capacity=self.log_queue_size, overflow=self.log_overflow)
+
+        return logger
+
+    def start_server(self, listen_sockets=None):
+        """
+        Starts the server and listens for incoming connections.
+        :param listen_sockets: Already bound and listening sockets to serve instead of
+                               binding new ones, e.g. from another instance's
+                               detach_listeners() during a zero-downtime restart.
+        """
+        try:
+            self.listen_sockets = list(listen_sockets) if listen_sockets else self._create_listeners()
+            self.server_socket = self.listen_sockets[0]
+            for listen_socket in self.listen_sockets:
+                listen_socket.setblocking(False)
+            self._running = True
+            self._accepting = True
+            self._stop_event.clear()
+            self._listeners_released.clear()
+
+            # A socket pair lets stop_server and detach_listeners wake the accepting thread
+            self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+            self._wakeup_reader.setblocking(False)
+
+            addresses = []
+            if self.host is not None:
+                addresses.append(f"{self.host}:{self.port}")
+            if self.unix_socket_path:
+                addresses.append(f"unix:{self.unix_socket_path}")
+            origin = ", adopted listeners" if listen_sockets else ""
+            self.logger.info(f"Server started on {', '.join(addresses)} ({self.mode} mode{origin})")
+
+            if self.mode == "event_loop":
+                self._start_event_loop()
+            else:
+                self._start_workers()
+                # Start a thread to accept incoming connections
+                self._accept_thread = threading.Thread(target=self.accept_connections, daemon=True)
+                self._accept_thread.start()
+                if self.idle_timeout:
+                    self._reaper_thread = threading.Thread(target=self._reap_idle_threaded, daemon=True)
+                    self._reaper_thread.start()
+        except Exception as e:
+            self.logger.error(f"Error starting server: {e}")
+            raise
+
+    def _create_listeners(self):
+        """
+        Binds the configured TCP and Unix domain listening sockets.
+        :return: The list of listening sockets.
+        """
+        return create_listeners(self.host, self.port, self.unix_socket_path, self.backlog, self.reuse_port)
+
+    def _close_listeners(self):
+        """Closes every listener and removes the Unix socket file."""
+        close_listeners(self.listen_sockets, self.unix_socket_path)
+        self.listen_sockets = []
+
+    def accept_connections(self):
+        """Accepts incoming client connections on every listener until stopped or detached."""
+        self.logger.info("Waiting for client connections...")
+        selector = selectors.DefaultSelector()
+        for listen_socket in self.listen_sockets:
+            selector.register(listen_socket, selectors.EVENT_READ)
+        selector.register(self._wakeup_reader, selectors.EVENT_READ)
+        try:
+            while self._running and self._accepting:
+                for key, _ in selector.select():
+                    if key.fileobj is self._wakeup_reader:
+                        self._drain_wakeup()
+                    else:
+                        self._accept_threaded(key.fileobj)
+        except Exception as e:
+            self.logger.error(f"Error in accept loop: {e}")
+        finally:
+            selector.close()
+            self._listeners_released.set()
+
+    def _accept_threaded(self, listen_socket):
+        """Accepts every pending connection on a listener and hands each to a thread."""
+        while self._running and self._accepting:
+            try:
+                client_socket, client_address = listen_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except Exception as e:
+                self.logger.error(f"Error accepting connection: {e}")
+                return
+
+            try:
+                # Some platforms make accepted sockets inherit the listener's non-blocking flag
+                client_socket.setblocking(True)
+                # Unix domain peers are usually unnamed; identify them by the socket path
+                client_address = client_address or f"unix:{self.unix_socket_path}"
+                self.logger.info(f"Connection established with {client_address}")
+                self._increment("accepted")
+                self.metrics.connection_opened()
+
+                if self.max_workers:
+                    self._admit(client_socket, client_address)
+                    continue
+
+                # Start a thread to handle the client
+                client_thread = threading.Thread(
+                    target=self.handle_client, 
+                    args=(client_socket, client_address), 
+                    daemon=True
+                )
+                client_thread.start()
+                with self._connections_lock:
+                    self.client_threads = [t for t in self.client_threads if t.is_alive()]
+                    self.client_threads.append(client_thread)
+            except Exception as e:
+                self.logger.error(f"Error accepting connection: {e}")
+                client_socket.close()
+
+    def detach_listeners(self, timeout=5):
+        """
+        Stops accepting new connections and hands over the listening sockets without
+        closing them, so a successor can keep accepting on the same address with no
+        window in which clients are refused. Existing connections keep being served
+        until stop_server() drains them.
+        :param timeout: Maximum time to wait for the accepting thread to let go, in seconds.
+        :return: The listening sockets, still bound and listening.
+        """
+        self._accepting = False
+        self._wake()
+        self._listeners_released.wait(timeout)
+        listeners, self.listen_sockets = self.listen_sockets, []
+        self.server_socket = None
+        self.logger.info(f"Detached {len(listeners)} listening sockets")
+        return listeners
+
+    def handle_client(self, client_socket, client_address):
+        """
+        Handles communication with a connected client.
+        :param client_socket: The socket object for the connected client.
+        :param client_address: The address of the connected client.
+        """
+        recv_buffer = bytearray(self.recv_buffer_size)
+        recv_view = memoryview(recv_buffer)
+        connection = ClientConnection(client_socket, client_address, self._new_protocol_state())
+        self._configure_client_socket(client_socket)
+        with self._connections_lock:
+            self.connections[client_socket.fileno()] = connection
+        self._increment("active")
+        try:
+            while self._running:
+                # Receive data from client straight into the reusable buffer
+                received = client_socket.recv_into(recv_buffer)
+                if not received:
+                    break  # Client disconnected, or the server is draining
+                self.metrics.bytes_received(received)
+                connection.last_activity = time.monotonic()
+                connection.busy = True
+
+                # Send acknowledgments back to client
+                output = self._handle_received(connection.protocol, recv_view[:received], client_address)
+                if output:
+                    client_socket.sendall(output)
+                    self.metrics.bytes_sent(len(output))
+                connection.busy = False
+        except FrameError as e:
+            self.metrics.error()
+            self.logger.warning(f"Protocol error from {client_address}: {e}")
+        except Exception as e:
+            self.metrics.error()
+            self.logger.error(f"Error handling client {client_address}: {e}")
+        finally:
+            with self._connections_lock:
+                self.connections.pop(client_socket.fileno(), None)
+            self._increment("active", -1)
+            self.metrics.connection_closed()
+            client_socket.close()
+            self.logger.info(f"Connection closed with {client_address}")
+
+    def _configure_client_socket(self, client_socket):
+        """Applies the TCP keepalive settings to an accepted client socket."""
+        if not self.keepalive or client_socket.family == socket.AF_UNIX:
+            return
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # The tuning options are platform specific; apply whichever exist
+        for option, value in (("TCP_KEEPIDLE", self.keepalive_idle),
+                              ("TCP_KEEPINTVL", self.keepalive_interval),
+                              ("TCP_KEEPCNT", self.keepalive_count)):
+            if hasattr(socket, option):
+                client_socket.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+    def _idle_connections(self):
+        """Returns the connections that have been idle for longer than idle_timeout."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._connections_lock:
+            return [c for c in self.connections.values() if not c.busy and c.last_activity < cutoff]
+
+    def _reap_idle_threaded(self):
+        """Background reaper for threaded mode: shuts down idle connections periodically."""
+        interval = min(max(self.idle_timeout / 4, 0.1), 5)
+        while not self._stop_event.wait(interval):
+            for connection in self._idle_connections():
+                self.logger.info(f"Closing idle connection with {connection.address}")
+                # The handling thread sees end-of-stream and closes the socket itself
+                connection.shutdown()
+
+    def _start_workers(self):
+        """Starts the bounded pool of worker threads when max_workers is configured."""
+        for index in range(self.max_workers or 0):
+            worker = threading.Thread(target=self._worker_loop, name=f"NetworkWorker-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _worker_loop(self):
+        """Serves queued connections one at a time until a stop sentinel is received."""
+        while True:
+            item = self._connection_queue.get()
+            if item is None:
+                break
+            self._increment("queued", -1)
+            self.handle_client(*item)
+
+    def _admit(self, client_socket, client_address):
+        """
+        Queues a connection for the worker pool, or rejects it if the pool is saturated.
+        :param client_socket: The socket object for the connected client.
+        :param client_address: The address of the connected client.
+        """
+        with self._stats_lock:
+            in_use = self._stats["active"] + self._stats["queued"]
+            admitted = in_use < self.max_workers + self.queue_depth
+            if admitted:
+                self._stats["queued"] += 1
+            else:
+                self._stats["rejected"] += 1
+
+        if admitted:
+            self._connection_queue.put((client_socket, client_address))
+            return
+
+        self.logger.warning(f"Rejecting {client_address}: worker pool is busy")
+        busy = encode_frame(BUSY_RESPONSE) if self.framed else BUSY_RESPONSE.encode('utf-8')
+        try:
+            client_socket.settimeout(1)
+            client_socket.sendall(busy)
+        except OSError:
+            pass
+        finally:
+            self.metrics.connection_closed()
+            client_socket.close()
+
+    def _increment(self, counter, amount=1):
+        """Adjusts one of the connection counters reported by get_stats."""
+        with self._stats_lock:
+            self._stats[counter] += amount
+
+    def get_stats(self):
+        """
+        Returns a snapshot of the connection counters.
+        :return: A dict with accepted, active, queued and rejected connection counts.
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def get_metrics(self):
+        """
+        Returns the connection counters, the current send queue depth and, when metrics
+        are enabled, traffic counters and message latency percentiles.
+        :return: A dict of metric names to values.
+        """
+        result = self.get_stats()
+        # list() copies the values atomically even while the event loop mutates the dict
+        send_queues = [len(connection.outbuf) for connection in list(self.connections.values())]
+        result["send_queue_bytes"] = sum(send_queues)
+        result["send_queue_max_bytes"] = max(send_queues, default=0)
+        result.update(self.metrics.snapshot())
+        return result
+
+    def dump_metrics(self):
+        """
+        Logs the current metrics and returns them as text.
+        :return: The formatted metrics.
+        """
+        text = format_metrics(self.get_metrics())
+        self.logger.info(f"Network metrics:\n{text}")
+        return text
+
+    def _new_protocol_state(self):
+        """Creates the per-connection decoding state for the configured wire protocol."""
+        if self.framed:
+            return FrameParser(self.max_frame_size)
+        # Incremental decoding keeps multibyte characters split across reads intact
+        return codecs.getincrementaldecoder('utf-8')()
+
+    def _handle_received(self, protocol, data, client_address):
+        """
+        Decodes received bytes and processes every complete message in them.
+        :param protocol: The connection's FrameParser or incremental decoder.
+        :param data: The bytes just received from the client.
+        :param client_address: The address of the client.
+        :return: The encoded responses to send back, as bytes.
+        """
+        timed = self.metrics.enabled
+        if not self.framed:
+            message = protocol.decode(data)
+            if not message:
+                return b""
+            started = time.perf_counter() if timed else 0
+            response = self.process_message(message, client_address).encode('utf-8')
+            if timed:
+                self.metrics.message_handled(time.perf_counter() - started)
+            return response
+
+        responses = []
+        for payload in protocol.feed(data):
+            started = time.perf_counter() if timed else 0
+            response = self.process_message(payload.decode('utf-8'), client_address)
+            responses.append(encode_frame(response))
+            if timed:
+                self.metrics.message_handled(time.perf_counter() - started)
+        return b"".join(responses)
+
+    def process_message(self, message, client_address):
+        """
+        Builds the response for a single client message. Shared by all serving modes.
+        :param message: The decoded message received from the client.
+        :param client_address: The address of the client that sent it.
+        :return: The response string to send back.
+        """
+        if self.message_handler:
+            # Command payloads may carry credentials, so only their size is logged
+            self.logger.debug(f"Received {len(message)} characters from {client_address}")
+            return self.message_handler(message, client_address)
+        self.logger.info(f"Received from {client_address}: {message}")
+        return f"Message received: {message}"
+
+    def _start_event_loop(self):
+        """Registers the listening sockets and starts the event loop thread."""
+        self._selector = selectors.DefaultSelector()
+        for listen_socket in self.listen_sockets:
+            self._selector.register(listen_socket, selectors.EVENT_READ, data=None)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ, data=self._wakeup_reader)
+
+        self._loop_thread = threading.Thread(target=self._run_event_loop, daemon=True)
+        self._loop_thread.start()
+
+    def _run_event_loop(self):
+        """Multiplexes the listening socket and every client socket on a single thread."""
+        self.logger.info("Event loop waiting for client connections...")
+        select_timeout = min(max(self.idle_timeout / 4, 0.1), 5) if self.idle_timeout else None
+        next_reap = time.monotonic() + (select_timeout or 0)
+        while self._running:
+            try:
+                events = self._selector.select(select_timeout)
+            except Exception as e:
+                self.logger.error(f"Error in event loop: {e}")
+                break
+
+            for key, mask in events:
+                if key.data is None:
+                    self._accept_nonblocking(key.fileobj)
+                elif key.data is self._wakeup_reader:
+                    self._drain_wakeup()
+                else:
+                    connection = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._read_nonblocking(connection)
+                    if mask & selectors.EVENT_WRITE and connection.sock.fileno() != -1:
+                        self._write_nonblocking(connection)
+
+            if not self._accepting and not self._listeners_released.is_set():
+                self._unregister_listeners()
+                self._listeners_released.set()
+
+            if select_timeout and time.monotonic() >= next_reap:
+                next_reap = time.monotonic() + select_timeout
+                for connection in self._idle_connections():
+                    self.logger.info(f"Closing idle connection with {connection.address}")
+                    self._close_connection(connection)
+
+        self._drain_event_loop()
+        self._selector.close()
+
+    def _drain_event_loop(self):
+        """Stops accepting, flushes pending responses until the drain deadline, then closes everything."""
+        self._unregister_listeners()
+        self._close_listeners()
+
+        # Connections with nothing left to send can go straight away; the rest only
+        # wait for writability so further client input is ignored
+        for connection in list(self.connections.values()):
+            if not connection.outbuf:
+                self._close_connection(connection)
+            else:
+                connection.events = selectors.EVENT_WRITE
+                self._selector.modify(connection.sock, selectors.EVENT_WRITE, data=connection)
+
+        while self.connections and time.monotonic() < self._drain_deadline:
+            remaining = self._drain_deadline - time.monotonic()
+            for key, mask in self._selector.select(max(remaining, 0)):
+                connection = key.data
+                if not isinstance(connection, ClientConnection):
+                    continue
+                if mask & selectors.EVENT_WRITE:
+                    self._write_nonblocking(connection)
+                if connection.sock.fileno() != -1 and not connection.outbuf:
+                    self._close_connection(connection)
+
+        for connection in list(self.connections.values()):
+            self._close_connection(connection)
+
+    def _unregister_listeners(self):
+        """Stops the event loop from watching the listening sockets."""
+        for listen_socket in self.listen_sockets:
+            try:
+                self._selector.unregister(listen_socket)
+            except (KeyError, ValueError):
+                pass
+
+    def _accept_nonblocking(self, listen_socket):
+        """Accepts every pending connection on a listening socket."""
+        while True:
+            try:
+                client_socket, client_address = listen_socket.accept()
+                client_address = client_address or f"unix:{self.unix_socket_path}"
+            except (BlockingIOError, InterruptedError):
+                return
+            except Exception as e:
+                if self._running:
+                    self.logger.error(f"Error accepting connection: {e}")
+                return
+
+            client_socket.setblocking(False)
+            self._configure_client_socket(client_socket)
+            self._increment("accepted")
+            self._increment("active")
+            self.metrics.connection_opened()
+            connection = ClientConnection(client_socket, client_address, self._new_protocol_state())
+            self.connections[client_socket.fileno()] = connection
+            self._selector.register(client_socket, selectors.EVENT_READ, data=connection)
+            self.logger.info(f"Connection established with {client_address}")
+
+    def _read_nonblocking(self, connection):
+        """Reads whatever is available from a client and queues the responses."""
+        try:
+            received = connection.sock.recv_into(self._recv_buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except Exception as e:
+            self.logger.error(f"Error handling client {connection.address}: {e}")
+            self._close_connection(connection)
+            return
+
+        if not received:
+            self._close_connection(connection)  # Client disconnected
+            return
+        self.metrics.bytes_received(received)
+        connection.last_activity = time.monotonic()
+
+        try:
+            with memoryview(self._recv_buffer) as view:
+                output = self._handle_received(connection.protocol, view[:received], connection.address)
+        except FrameError as e:
+            self.metrics.error()
+            self.logger.warning(f"Protocol error from {connection.address}: {e}")
+            self._close_connection(connection)
+            return
+        except Exception as e:
+            self.metrics.error()
+            self.logger.error(f"Error handling client {connection.address}: {e}")
+            self._close_connection(connection)
+            return
+
+        if output:
+            connection.outbuf += output
+            self._write_nonblocking(connection)
+
+    def _write_nonblocking(self, connection):
+        """Flushes as much of the pending output as the socket accepts without blocking."""
+        if connection.outbuf:
+            try:
+                sent = connection.sock.send(connection.outbuf)
+                del connection.outbuf[:sent]
+                self.metrics.bytes_sent(sent)
+            except (BlockingIOError, InterruptedError):
+                pass
+            except Exception as e:
+                self.logger.error(f"Error sending to client {connection.address}: {e}")
+                self._close_connection(connection)
+                return
+
+        # Only watch for writability while there is output left to flush. Stop reading
+        # from a client that does not read its responses until they drain below the
+        # low-water mark, and once draining stop reading altogether
+        pending = len(connection.outbuf)
+        if connection.events & selectors.EVENT_READ:
+            reading = pending < self.send_high_water
+        else:
+            reading = pending <= self.send_low_water
+        wanted = selectors.EVENT_READ if self._running and reading else 0
+        if connection.outbuf:
+            wanted |= selectors.EVENT_WRITE
+        if wanted and wanted != connection.events:
+            connection.events = wanted
+            self._selector.modify(connection.sock, wanted, data=connection)
+
+    def _close_connection(self, connection):
+        """Unregisters and closes a client socket managed by the event loop."""
+        fileno = connection.sock.fileno()
+        if fileno == -1:
+            return
+        self.connections.pop(fileno, None)
+        self._increment("active", -1)
+        self.metrics.connection_closed()
+        try:
+            self._selector.unregister(connection.sock)
+        except (KeyError, ValueError):
+            pass
+        connection.sock.close()
+        self.logger.info(f"Connection closed with {connection.address}")
+
+    def _wake(self):
+        """Wakes the thread waiting in select() so it re-checks the server state."""
+        try:
+            self._wakeup_writer.send(b"\0")
+        except (AttributeError, OSError):
+            pass
+
+    def _drain_wakeup(self):
+        """Consumes wake-up bytes written by _wake."""
+        try:
+            while self._wakeup_reader.recv(1024):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def stop_server(self, drain_timeout=None):
+        """
+        Stops the server and closes all client connections.
+
+        New connections are refused immediately; messages already being handled are
+        allowed to finish and send their responses until a single global deadline,
+        after which every remaining connection is closed at once.
+        :param drain_timeout: Overrides the drain deadline configured on the instance, in seconds.
+        """
+        self.logger.info("Stopping server...")
+        timeout = self.drain_timeout if drain_timeout is None else drain_timeout
+        self._drain_deadline = time.monotonic() + timeout
+        try:
+            self._running = False
+            self._stop_event.set()
+
+            self._wake()
+            if self._loop_thread:
+                # The event loop drains and closes its own client connections
+                self._loop_thread.join(timeout=timeout + 1)
+                self._loop_thread = None
+            else:
+                # Stop accepting before draining the threaded connections
+                if self._accept_thread:
+                    self._accept_thread.join(timeout=1)
+                    self._accept_thread = None
+                self._close_listeners()
+
+            # Close connections still waiting for a worker, then release the workers
+            while True:
+                try:
+                    client_socket, _ = self._connection_queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._increment("queued", -1)
+                client_socket.close()
+            for _ in self._workers:
+                self._connection_queue.put(None)
+
+            # Half-close every connection at once: idle handlers see end-of-stream right
+            # away, busy ones still send their response before noticing it
+            with self._connections_lock:
+                connections = list(self.connections.values())
+            for connection in connections:
+                connection.shutdown(socket.SHUT_RD)
+
+            threads = self.client_threads + self._workers
+            if self._reaper_thread:
+                threads.append(self._reaper_thread)
+            for thread in threads:
+                thread.join(timeout=max(self._drain_deadline - time.monotonic(), 0))
+
+            # Force-close whatever missed the deadline
+            with self._connections_lock:
+                connections = list(self.connections.values())
+            if connections:
+                self.logger.warning(f"Drain deadline reached; closing {len(connections)} connections")
+            for connection in connections:
+                connection.shutdown()
+            self.client_threads = []
+            self._workers = []
+            self._reaper_thread = None
+
+            self._close_listeners()
+            for wakeup_socket in (self._wakeup_reader, self._wakeup_writer):
+                if wakeup_socket:
+                    wakeup_socket.close()
+            if self.server_socket:
+                self.server_socket.close()
+                self.logger.info("Server socket closed.")
+        except Exception as e:
+            self.logger.error(f"Error stopping server: {e}")
+
+if __name__ == "__main__":
+    # Example usage of NetworkManager
+    network_manager = NetworkManager(host="127.0.0.1", port=8080)
+    shutdown_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: shutdown_event.set())
+
+    try:
+        network_manager.start_server()
+        # Keep the server running without spinning; the timeout keeps Ctrl+C responsive
+        while not shutdown_event.wait(1.0):
+            pass
+        network_manager.stop_server()
+    except KeyboardInterrupt:
+        network_manager.stop_server()
+    except Exception as e:
+        network_manager.logger.error(f"Unexpected error: {e}")
@@ -0,0 +1,117 @@
+import json
+
+
+class RouterError(Exception):
+    """Raised by command handlers to return an error response to the client."""
+
+
+class RequestRouter:
+    """
+    Dispatches command frames received by the NetworkManager to long-lived managers.
+
+    Requests and responses are compact JSON objects carried one per frame:
+        request:  {"id": 7, "cmd": "VALIDATE_SESSION", "args": {"token": "..."}}
+        response: {"id": 7, "ok": true, "result": "alice"}
+                  {"id": 7, "ok": false, "error": "Unknown command: FOO"}
+    The request id is echoed back so a client can pipeline many calls on one
+    connection and match responses to requests.
+    """
+
+    def __init__(self, logger=None):
+        """
+        Initialize an empty routing table.
+        :param logger: Optional logger used to report handler failures.
+        """
+        self.routes = {}
+        self.logger = logger
+        self.register("PING", lambda args: "PONG")
+
+    def register(self, command, handler):
+        """
+        Registers a handler for a command.
+        :param command: Command name, matched case-insensitively.
+        :param handler: Callable taking the request's args dict and returning a JSON-serializable result.
+        """
+        self.routes[command.upper()] = handler
+
+    @classmethod
+    def for_managers(cls, auth_manager=None, session_manager=None, user_manager=None, logger=None):
+        """
+        Builds a router exposing the standard commands of the given managers.
+        :param auth_manager: AuthManager used for AUTH and LOGOUT.
+        :param session_manager: SessionManager used for VALIDATE_SESSION and GET_USER.
+        :param user_manager: UserManager used for LIST_USERS, and for AUTH when no
+                             AuthManager is available.
+        :param logger: Optional logger used to report handler failures.
+        :return: A configured RequestRouter.
+        """
+        router = cls(logger=logger)
+
+        if auth_manager:
+            def auth(args):
+                token = auth_manager.login_user(args["username"], args["password"])
+                if not token:
+                    raise RouterError("Invalid credentials")
+                return token
+
+            router.register("AUTH", auth)
+            router.register("LOGOUT", lambda args: auth_manager.logout_user(args["token"]))
+        elif user_manager:
+            router.register("AUTH", lambda args: user_manager.authenticate(args["username"], args["password"]))
+
+        if session_manager:
+            router.register("VALIDATE_SESSION", lambda args: session_manager.validate_session(args["token"]))
+
+            def get_user(args):
+                user = session_manager.get_user_data(args["token"])
+                if user is None:
+                    raise RouterError("Invalid session")
+                username, email = user
+                return {"username": username, "email": email}
+
+            router.register("GET_USER", get_user)
+
+        if user_manager:
+            router.register("LIST_USERS", lambda args: user_manager.list_users())
+
+        return router
+
+    def dispatch(self, message, client_address=None):
+        """
+        Handles one request and builds its response. Usable as a NetworkManager message_handler.
+        :param message: The JSON request text.
+        :param client_address: The address of the client that sent it.
+        :return: The JSON response text.
+        """
+        request_id = None
+        try:
+            request = json.loads(message)
+            request_id = request.get("id")
+            command = str(request["cmd"]).upper()
+            args = request.get("args") or {}
+        except (ValueError, AttributeError, KeyError) as e:
+            return self._response(request_id, error=f"Malformed request: {e!r}")
+
+        handler = self.routes.get(command)
+        if handler is None:
+            return self._response(request_id, error=f"Unknown command: {command}")
+
+        try:
+            return self._response(request_id, result=handler(args))
+        except RouterError as e:
+            return self._response(request_id, error=str(e))
+        except KeyError as e:
+            return self._response(request_id, error=f"Missing argument: {e}")
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Error handling {command} from {client_address}: {e}")
+            return self._response(request_id, error="Internal error")
+
+    @staticmethod
+    def _response(request_id, result=None, error=None):
+        """Serializes a response object."""
+        if error is None:
+            response = {"id": request_id, "ok": True, "result": result}
+        else:
+            response = {"id": request_id, "ok": False, "error": error}
+        return json.dumps(response, separators=(",", ":"))